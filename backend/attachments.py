@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+from rate_limit import CallCancelled
+
+# Where handles are remembered between sessions
+REGISTRY_PATH = os.getenv("ATTACHMENT_REGISTRY", ".attachments.json")
+# Providers that don't say when a file expires are trusted for this long
+DEFAULT_TTL_SECONDS = float(os.getenv("ATTACHMENT_TTL_HOURS", "24")) * 3600
+# A handle this close to expiring is replaced rather than risked in a request
+EXPIRY_MARGIN_SECONDS = 3600
+# After a failed upload the account inlines files for a while before trying again
+RETRY_UPLOAD_SECONDS = 300
+
+class AttachmentManager:
+    """Upload each attachment once per provider account and reuse the handle it returns
+
+    Handles are keyed by provider account and content hash, carry the
+    expiry the provider reported, and are kept in a small JSON registry so
+    a file uploaded in one session is still referenced, not re-sent, in the
+    next. Expired entries are dropped whenever the registry changes.
+    """
+
+    _handles = None
+    _failures = {}
+    _locks = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        return os.getenv("ATTACHMENT_HANDLES", "1") != "0"
+
+    @classmethod
+    def _load(cls):
+        if cls._handles is None:
+            try:
+                with open(REGISTRY_PATH, "r", encoding="utf-8") as file:
+                    cls._handles = json.load(file)
+            except (OSError, ValueError):
+                cls._handles = {}
+            cls._prune()
+        return cls._handles
+
+    @classmethod
+    def _prune(cls):
+        now = time.time()
+        for key in [key for key, entry in cls._handles.items() if entry["expires_at"] <= now]:
+            del cls._handles[key]
+
+    @classmethod
+    def _save(cls):
+        temporary = f"{REGISTRY_PATH}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(cls._handles, file, indent=2)
+            os.replace(temporary, REGISTRY_PATH)
+        except OSError:
+            # The registry only saves uploads in later sessions; this one still has it in memory
+            pass
+
+    @classmethod
+    def handle(cls, account, content_key, upload_function):
+        """Return the live handle for some content, calling upload_function() to create one on a miss
+
+        upload_function returns (reference, mime type, expiry timestamp or None).
+        Returns None when uploads to this account are failing, so the caller inlines instead.
+        """
+        key = f"{account}:{content_key}"
+        with cls._lock:
+            cls._load()
+            if time.time() - cls._failures.get(account, 0) < RETRY_UPLOAD_SECONDS:
+                return None
+            key_lock = cls._locks.setdefault(key, threading.Lock())
+
+        # Bots sharing an account wait for the first upload instead of repeating it
+        with key_lock:
+            with cls._lock:
+                entry = cls._handles.get(key)
+            if entry and entry["expires_at"] - EXPIRY_MARGIN_SECONDS > time.time():
+                return entry
+
+            try:
+                reference, mime_type, expires_at = upload_function()
+            except CallCancelled:
+                # The turn moved on; that says nothing about the account's uploads
+                raise
+            except Exception:
+                with cls._lock:
+                    cls._failures[account] = time.time()
+                return None
+
+            entry = {
+                "reference": reference,
+                "mime_type": mime_type,
+                "expires_at": expires_at or time.time() + DEFAULT_TTL_SECONDS
+            }
+            with cls._lock:
+                cls._handles[key] = entry
+                cls._prune()
+                cls._save()
+            return entry
+
+    @classmethod
+    def is_live(cls, reference):
+        """Whether a handle kept in a history can still be sent to its provider"""
+        with cls._lock:
+            now = time.time()
+            return any(entry["reference"] == reference and entry["expires_at"] - EXPIRY_MARGIN_SECONDS > now
+                       for entry in cls._load().values())
\ No newline at end of file
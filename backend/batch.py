@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from main import AVAILABLE_BOTS
+from registry import ProviderRegistry
+from dispatcher import Dispatcher
+from instrumentation import Metrics
+from response_cache import ResponseCache
+from upload import Upload
+from extraction import DocumentExtractor
+from rate_limit import RateScheduler
+
+load_dotenv()
+
+def load_prompts(path):
+    """Read a JSONL prompt file: {"id", "prompt", "attachment", "file_prompt", "full_data"} per line"""
+    prompts = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            attachment = record.get("attachment")
+            if attachment and not os.path.isabs(attachment):
+                attachment = os.path.join(base_dir, attachment)
+            prompts.append({
+                "id": str(record.get("id", line_number)),
+                "prompt": record["prompt"],
+                "attachment": attachment,
+                "file_prompt": record.get("file_prompt"),
+                "full_data": bool(record.get("full_data"))
+            })
+    return prompts
+
+def load_bot_configs(path):
+    """Read a JSON list of {"bot", "model", "audience", "role", "label", "hedge"} bot configs
+
+    `bot` is either the number or the name used in AVAILABLE_BOTS.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        configs = json.load(file)
+
+    by_name = {bot["name"].lower(): bot for bot in AVAILABLE_BOTS.values()}
+    resolved = []
+    for config in configs:
+        key = str(config["bot"])
+        bot_info = AVAILABLE_BOTS.get(key) or by_name.get(key.lower())
+        if not bot_info:
+            raise ValueError(f"Unknown bot in config: {key}")
+
+        module = ProviderRegistry.load(bot_info["module"])
+        model = config.get("model") or module.get_available_models()["1"]
+        resolved.append({
+            "label": config.get("label") or f"{bot_info['name']}:{model}",
+            "module": bot_info["module"],
+            "model": model,
+            "audience": config.get("audience", ""),
+            "role": config.get("role", ""),
+            "hedge": bool(config.get("hedge"))
+        })
+    return resolved
+
+def load_done(path):
+    """Collect (prompt id, bot label) pairs already in the results file
+
+    Pairs skipped because a provider's circuit was open are left out so a rerun retries them.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                if record["status"] != "skipped":
+                    done.add((record["prompt_id"], record["bot"]))
+    return done
+
+class RequestPacer:
+    """Spread request starts evenly so the batch stays under a requests-per-minute limit"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, count=1):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval * count
+        time.sleep(max(0.0, slot - now))
+
+class BatchRunner:
+    """Run every prompt against every bot config and append one result per pair"""
+
+    def __init__(self, prompts, configs, out_path, concurrency=4, requests_per_minute=0, cache=None):
+        self.prompts = prompts
+        self.configs = configs
+        self.out_path = out_path
+        self.concurrency = concurrency
+        self.pacer = RequestPacer(requests_per_minute)
+        self.cache = cache or ResponseCache(enabled=False)
+        # The dispatcher's metrics give hedged bots a p95 first-token threshold as the run goes on
+        self.metrics = Metrics()
+        self.dispatcher = Dispatcher(max_workers=concurrency * len(configs), metrics=self.metrics)
+        self.write_lock = threading.Lock()
+
+    def run(self):
+        done = load_done(self.out_path)
+        jobs = []
+        for prompt in self.prompts:
+            pending = [config for config in self.configs if (prompt["id"], config["label"]) not in done]
+            if pending:
+                jobs.append((prompt, pending))
+
+        skipped = len(self.prompts) * len(self.configs) - sum(len(pending) for _, pending in jobs)
+        print(f"{len(jobs)} prompts to run, {skipped} results already in {self.out_path}")
+
+        with open(self.out_path, "a", encoding="utf-8") as out_file:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prompt") as executor:
+                for index, _ in enumerate(executor.map(lambda job: self._run_prompt(job[0], job[1], out_file), jobs), 1):
+                    queued = sum(stats["queued"] for stats in RateScheduler.stats().values())
+                    print(f"  {index}/{len(jobs)} prompts done, {queued} calls waiting for rate limit budget")
+
+        self.dispatcher.shutdown()
+
+    def _make_bots(self, configs):
+        """Initialize a fresh bot per config so every prompt starts from an empty history"""
+        bots = {}
+        for config in configs:
+            module = ProviderRegistry.load_sdk(config["module"])
+            bots[config["label"]] = {
+                "instance": module.initialize_bot(config["audience"], config["role"], config["model"]),
+                "ask_function": self.cache.wrap(config["module"], module.ask),
+                "stream_function": self.cache.wrap_stream(config["module"], module.ask_stream),
+                "module_name": config["module"],
+                "hedge": config["hedge"]
+            }
+        return bots
+
+    def _run_prompt(self, prompt, configs, out_file):
+        upload = None
+        try:
+            if prompt["attachment"]:
+                upload = Upload.from_path(prompt["attachment"])
+                if prompt["full_data"]:
+                    upload = upload.with_full_data()
+            bots = self._make_bots(configs)
+        except Exception as e:
+            results = {config["label"]: {"status": "error", "text": str(e), "latency": 0.0, "model": config["model"]}
+                       for config in configs}
+        else:
+            self.pacer.wait(len(bots))
+            # Streaming is only used so that time-to-first-token gets measured
+            results = self.dispatcher.dispatch(
+                bots,
+                prompt["prompt"],
+                upload=upload,
+                file_prompt=prompt["file_prompt"],
+                on_delta=lambda bot_name, delta: None
+            )
+
+        with self.write_lock:
+            for label, result in results.items():
+                record = {"prompt_id": prompt["id"], "bot": label, **result}
+                out_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out_file.flush()
+
+def summarize_results(out_path):
+    """Aggregate a results file into latency, throughput and error figures per bot and model
+
+    Hedged calls are reported under the backup model that answered them, so
+    a bot can have more than one model.
+    """
+    metrics = Metrics()
+    incompatible = {}
+    with open(out_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["status"] == "incompatible":
+                incompatible[record["bot"]] = incompatible.get(record["bot"], 0) + 1
+            metrics.record(record["bot"], record)
+
+    summary = {label: {"incompatible": count, "models": {}} for label, count in incompatible.items()}
+    for (label, model), stats in sorted(metrics.summary().items()):
+        bot_summary = summary.setdefault(label, {"incompatible": 0, "models": {}})
+        bot_summary["models"][model] = {
+            **stats,
+            "error_rate": stats["errors"] / stats["calls"] if stats["calls"] else 0.0
+        }
+    return metrics, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Run prompts against several bots without the interactive chat")
+    parser.add_argument("--prompts", required=True, help="JSONL file with one prompt per line")
+    parser.add_argument("--bots", required=True, help="JSON file with a list of bot configs")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL results file, appended to and used to resume")
+    parser.add_argument("--summary", help="where to write aggregate figures (default: <out>.summary.json)")
+    parser.add_argument("--concurrency", type=int, default=4, help="prompts in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="overall cap on provider requests per minute on top of the per-key budgets (0 for none)")
+    parser.add_argument("--cache", action="store_true", help="answer repeated requests from the response cache")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        load_prompts(args.prompts),
+        load_bot_configs(args.bots),
+        args.out,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rate,
+        cache=ResponseCache(enabled=True) if args.cache else None
+    )
+    runner.run()
+    DocumentExtractor.shutdown()
+
+    metrics, summary = summarize_results(args.out)
+    summary_path = args.summary or args.out + ".summary.json"
+    with open(summary_path, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+
+    print("\n" + metrics.format_table())
+    print(f"\nResults: {os.path.abspath(args.out)}")
+    print(f"Summary: {os.path.abspath(summary_path)}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
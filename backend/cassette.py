@@ -0,0 +1,90 @@
+import os
+import json
+import base64
+import hashlib
+import threading
+from urllib.parse import urlsplit
+import httpx
+
+# Response headers that no longer apply once the body has been read and decoded
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+
+class CassetteMiss(httpx.TransportError):
+    """Raised in replay mode when no recording matches a request"""
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records provider traffic to disk or replays it
+
+    Cassettes live in one folder per provider host, one JSON file per request,
+    named by a hash of the method, URL and canonical JSON body. Headers are not
+    part of the key, so API keys never end up on disk and replay works with
+    dummy keys.
+    """
+
+    def __init__(self, mode, directory, inner=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.inner = inner or httpx.HTTPTransport()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def request_key(request):
+        body = request.content
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+        digest = hashlib.sha256()
+        digest.update(request.method.encode("utf-8"))
+        digest.update(str(request.url).encode("utf-8"))
+        digest.update(body)
+        return digest.hexdigest()
+
+    def _path(self, request):
+        host = urlsplit(str(request.url)).netloc.replace(":", "_")
+        return os.path.join(self.directory, host, self.request_key(request) + ".json")
+
+    def handle_request(self, request):
+        request.read()
+        path = self._path(request)
+
+        if self.mode == "replay":
+            if not os.path.exists(path):
+                raise CassetteMiss(f"No cassette for {request.method} {request.url}", request=request)
+            with open(path, "r", encoding="utf-8") as file:
+                recording = json.load(file)
+            return httpx.Response(
+                recording["status"],
+                headers=recording["headers"],
+                content=base64.b64decode(recording["body"]),
+                request=request
+            )
+
+        response = self.inner.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS]
+        recording = {
+            "request": {
+                "method": request.method,
+                "url": str(request.url),
+                "body": request.content.decode("utf-8", errors="replace")
+            },
+            "status": response.status_code,
+            "headers": headers,
+            "body": base64.b64encode(body).decode("ascii")
+        }
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(recording, file, indent=1)
+
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def close(self):
+        self.inner.close()
\ No newline at end of file
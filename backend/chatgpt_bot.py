@@ -1,14 +1,35 @@
 import os
-from openai import OpenAI
-import base64
-import mimetypes
-from pathlib import Path
+from transport import Transport
+from file_handler import UnsupportedFileError
+from instrumentation import payload_size, note_call
+from rate_limit import RateScheduler
+from history import HistoryStore
+from attachments import AttachmentManager
+
+# Imported lazily in initialize_bot so listing models stays fast
+SDK_MODULES = ("openai",)
+
+BASE_URL = "https://api.openai.com/v1"
+IMAGE_PROFILE = "openai"
+
+# Budget per API key, matching the OpenAI tier 1
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200000
 
 def initialize_bot(audience, role, model=None):
     """Initialize ChatGPT bot with audience, role and model"""
+    from openai import OpenAI
+    
     API_KEY = os.getenv('OPENAI_API_KEY')
     
-    client = OpenAI(api_key=API_KEY)
+    base_url = Transport.resolve(BASE_URL)
+    
+    client = OpenAI(
+        base_url=base_url,
+        api_key=API_KEY,
+        max_retries=0,
+        http_client=Transport.get_client(base_url)
+    )
     
     system_content = ""
     if audience and role:
@@ -30,68 +51,122 @@ def initialize_bot(audience, role, model=None):
     
     return {
         "client": client,
-        "history": [system_msg],
-        "model": model
+        "history": HistoryStore([system_msg]),
+        "model": model,
+        "scheduler": RateScheduler.for_key(base_url, API_KEY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
     }
 
-def ask(bot, question, file_path=None, file_prompt=None):
-    """Send a question to ChatGPT and get the response"""
+def _file_part(bot, upload):
+    """Refer to a PDF through the Files API, uploading it once per key; None means inline it instead"""
+    if upload.mime_type != "application/pdf" or not AttachmentManager.enabled():
+        return None
+    
+    def upload_file():
+        file, _ = bot["scheduler"].call(
+            bot["client"].files.create,
+            0,
+            cancel=bot.get("cancel"),
+            file=(upload.name, upload.data, upload.mime_type),
+            purpose="user_data"
+        )
+        return file.id, upload.mime_type, getattr(file, "expires_at", None)
+    
+    handle = AttachmentManager.handle(bot["scheduler"].label, upload.sha256, upload_file)
+    if handle is None:
+        return None
+    return {"type": "file", "file": {"file_id": handle["reference"]}}
+
+def _build_question_msg(bot, question, upload=None, file_prompt=None):
+    """Build the user message for a question, returning (message, error)"""
     question_content = []
     
     question_text = file_prompt if file_prompt else question
-    if file_path and not file_prompt:
+    if upload and not file_prompt:
         question_text = f"Here's a file. {question}"
     
     question_content.append({"type": "text", "text": question_text})
     
-    if file_path:
-        try:
-            mime_type, _ = mimetypes.guess_type(file_path)
-            file_extension = Path(file_path).suffix.lower().replace('.', '')
-            
-            if mime_type and mime_type.startswith('image/'):
-                with open(file_path, "rb") as image_file:
-                    base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                
-                question_content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{base64_image}"
-                    }
-                })
-            else:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        file_content = file.read()
-                    
-                    question_content[0]["text"] += f"\n\nFile content:\n{file_content}"
-                    
-                except UnicodeDecodeError:
-                    return "Error: This file format is not supported directly. For binary files other than images, consider using OpenAI's File API or Assistants API instead."
-                
-        except Exception as e:
-            return f"Error processing file: {str(e)}"
+    if upload:
+        file_part = _file_part(bot, upload)
+        if upload.is_image:
+            question_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": upload.image(IMAGE_PROFILE).data_url
+                }
+            })
+        elif file_part:
+            question_content.append(file_part)
+        elif upload.prompt_text is not None:
+            question_content[0]["text"] += f"\n\nFile content:\n{upload.prompt_text}"
+        else:
+            return None, "This file format is not supported directly. For binary files other than images, consider using OpenAI's File API or Assistants API instead."
     
     question_msg = {
         "role": "user",
         "content": question_content
     }
     
+    return question_msg, None
+
+def ask(bot, question, upload=None, file_prompt=None):
+    """Send a question to ChatGPT and get the response"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
     bot["history"].append(question_msg)
     
     try:
-        response = bot["client"].chat.completions.create(
+        request_bytes = payload_size(bot["history"])
+        response, retries = bot["scheduler"].call(
+            bot["client"].chat.completions.create,
+            request_bytes // 4,
+            cancel=bot.get("cancel"),
             messages=bot["history"],
             model=bot["model"]
         )
         
         answer_msg = response.choices[0].message
         bot["history"].append(answer_msg)
+        note_call(bot, request_bytes, answer_msg.content, response.usage, retries)
         
         return answer_msg.content
     except Exception as e:
         return f"Error: {str(e)}"
 
+def ask_stream(bot, question, upload=None, file_prompt=None):
+    """Send a question to ChatGPT and yield the response as it is generated, raising if the call fails"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
+    bot["history"].append(question_msg)
+    
+    request_bytes = payload_size(bot["history"])
+    stream, retries = bot["scheduler"].call_stream(
+        bot["client"].chat.completions.create,
+        request_bytes // 4,
+        cancel=bot.get("cancel"),
+        messages=bot["history"],
+        model=bot["model"],
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    
+    deltas = []
+    usage = None
+    with stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                deltas.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                usage = chunk.usage
+    
+    bot["history"].append({"role": "assistant", "content": "".join(deltas)})
+    note_call(bot, request_bytes, "".join(deltas), usage, retries)
+
 def get_available_models():
     """Return available models for ChatGPT"""
     return {
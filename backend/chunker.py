@@ -0,0 +1,196 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from context_window import MODEL_TOKEN_BUDGETS, DEFAULT_TOKEN_BUDGET
+from extraction import DocumentExtractor
+from history import HistoryStore
+
+# A file bigger than this share of the model's budget is answered chunk by chunk
+FILE_BUDGET_SHARE = 0.5
+# Each chunk takes this share of the budget, leaving room for the question and the answer
+CHUNK_BUDGET_SHARE = 0.4
+MAP_CONCURRENCY = 4
+NOT_FOUND = "NOT FOUND"
+
+def estimate_tokens(text):
+    """Same rough four-characters-per-token estimate the context window uses"""
+    return len(text) // 4
+
+class TextChunker:
+    """Read a text file incrementally and cut it into token-bounded chunks
+
+    Only one chunk is held in memory at a time. Chunks end at blank lines
+    when one comes along near the limit, otherwise at line ends, and lines
+    longer than a chunk are split. For CSV files the header row is repeated
+    at the top of every chunk so each one can be read on its own.
+    """
+
+    @staticmethod
+    def iter_chunks(path, max_tokens, repeat_header=False):
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as file:
+            header = file.readline() if repeat_header else ""
+            if len(header) > max_tokens * 2:
+                # A header this long would crowd out the data, so treat it as an ordinary line
+                file.seek(0)
+                header = ""
+            yield from TextChunker.chunk_lines(file, max_tokens, header)
+
+    @staticmethod
+    def chunk_lines(lines, max_tokens, header=""):
+        """Group an iterable of lines into chunks of at most max_tokens, each starting with header"""
+        limit = max(max_tokens * 4 - len(header), 1)
+        buffer = []
+        size = 0
+        for line in lines:
+            while len(line) > limit:
+                if buffer:
+                    yield header + "".join(buffer)
+                    buffer, size = [], 0
+                yield header + line[:limit]
+                line = line[limit:]
+
+            if buffer and size + len(line) > limit:
+                yield header + "".join(buffer)
+                buffer, size = [], 0
+
+            buffer.append(line)
+            size += len(line)
+
+            # Prefer paragraph breaks once the chunk is mostly full
+            if not line.strip() and size >= 0.8 * limit:
+                yield header + "".join(buffer)
+                buffer, size = [], 0
+
+        if buffer:
+            yield header + "".join(buffer)
+
+class ChunkedQuery:
+    """Answer a question about a file too large for one prompt with a map-reduce plan
+
+    The map step asks the question about every chunk in parallel on throwaway
+    copies of the bot that only keep its system prompt. The reduce step asks
+    the real bot once, with the notes from the chunks in place of the file,
+    so neither the prompt nor the history ever holds the whole file.
+    """
+
+    def __init__(self, bot_data, upload, question, file_prompt=None, cancel=None):
+        self.chunks = 0
+        self.bot_data = bot_data
+        self.upload = upload
+        self.question = file_prompt or question
+        self.cancel = cancel or threading.Event()
+        budget = MODEL_TOKEN_BUDGETS.get(bot_data["instance"]["model"], DEFAULT_TOKEN_BUDGET)
+        if bot_data.get("context"):
+            budget = bot_data["context"].token_budget
+        self.budget = budget
+        self.chunk_tokens = int(budget * CHUNK_BUDGET_SHARE)
+
+    @staticmethod
+    def applies(bot_data, upload):
+        """Whether an upload is text, or a document, too large to inline for this bot"""
+        if not upload or not (upload.is_text_like or upload.is_document):
+            return False
+        # Structured data is sent as a digest, which is small whatever the file's size
+        if upload.is_structured and not upload.full_data:
+            return False
+        budget = MODEL_TOKEN_BUDGETS.get(bot_data["instance"]["model"], DEFAULT_TOKEN_BUDGET)
+        if bot_data.get("context"):
+            budget = bot_data["context"].token_budget
+        if upload.is_document:
+            return DocumentExtractor.estimated_tokens(upload) > budget * FILE_BUDGET_SHARE
+        return upload.is_large or upload.estimated_tokens > budget * FILE_BUDGET_SHARE
+
+    @staticmethod
+    def _scratch(instance):
+        """A copy of the bot with only its system prompt, for one map call"""
+        scratch = dict(instance)
+        scratch["history"] = HistoryStore(message for message in instance["history"] if message.get("role") == "system")
+        if "first_message" in scratch:
+            scratch["first_message"] = True
+        scratch.pop("last_call", None)
+        return scratch
+
+    def _map_prompt(self, chunk, index):
+        return (f"You are reading part {index} of the file {self.upload.name}, which is too large to read at once.\n"
+                f"Question about the whole file: {self.question}\n\n"
+                f"Note everything in this part that helps answer the question, citing specifics. "
+                f"If nothing here is relevant, reply with exactly {NOT_FOUND}.\n\n"
+                f"File content:\n{chunk}")
+
+    def _ask_chunk(self, instance, prompt):
+        if self.cancel.is_set():
+            return None
+        answer = self.bot_data["ask_function"](self._scratch(instance), prompt)
+        if not answer or answer.startswith("Error") or answer.strip().upper().startswith(NOT_FOUND):
+            return None
+        return answer
+
+    def _map(self, instance, chunks, prompt_for):
+        """Run the map prompt over chunks with a bounded number in flight, keeping the notes in order"""
+        notes = []
+        window = threading.BoundedSemaphore(MAP_CONCURRENCY * 2)
+
+        def run(prompt):
+            try:
+                return self._ask_chunk(instance, prompt)
+            finally:
+                window.release()
+
+        with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="map") as executor:
+            futures = []
+            for index, chunk in enumerate(chunks, 1):
+                if self.cancel.is_set():
+                    break
+                # Don't read further ahead than the workers can take, so memory stays bounded
+                window.acquire()
+                futures.append((index, executor.submit(run, prompt_for(chunk, index))))
+            for index, future in futures:
+                note = future.result()
+                if note:
+                    notes.append((index, note))
+        return notes
+
+    def _reduce_notes(self, instance, notes):
+        """Fold the notes into fewer, shorter notes until they fit the budget"""
+        while len(notes) > 1 and estimate_tokens("".join(note for _, note in notes)) > self.chunk_tokens:
+            groups, group, size = [], [], 0
+            for index, note in notes:
+                if group and size + estimate_tokens(note) > self.chunk_tokens:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append((index, note))
+                size += estimate_tokens(note)
+            groups.append(group)
+            if len(groups) == len(notes):
+                break
+
+            def prompt_for(group, index):
+                joined = "\n\n".join(f"Notes from part {part}:\n{note}" for part, note in group)
+                return (f"Combine these notes about the file {self.upload.name} into one shorter set of notes "
+                        f"that keeps everything relevant to: {self.question}\n\n{joined}")
+
+            notes = self._map(instance, groups, prompt_for)
+        return notes
+
+    def reduce_prompt(self, notes):
+        if not notes:
+            return (f"{self.question}\n\nThe file {self.upload.name} was too large to send whole and none of its parts "
+                    f"looked relevant to this question. Say so and answer as well as you can.")
+        joined = "\n\n".join(f"Notes from part {index}:\n{note}" for index, note in notes)
+        return (f"{self.question}\n\nThe file {self.upload.name} was too large to send whole, so it was read in parts. "
+                f"Answer using these notes taken from the relevant parts:\n\n{joined}")
+
+    def collect_notes(self, instance):
+        """The map step and any intermediate reduce rounds, returning the final notes"""
+        if self.upload.is_document:
+            # Documents are read back from their extracted pages rather than the original file
+            chunks = TextChunker.chunk_lines(DocumentExtractor.iter_lines(self.upload), self.chunk_tokens)
+        else:
+            repeat_header = self.upload.mime_type in ("text/csv", "application/csv")
+            chunks = TextChunker.iter_chunks(self.upload.path, self.chunk_tokens, repeat_header=repeat_header)
+
+        def prompt_for(chunk, index):
+            self.chunks = index
+            return self._map_prompt(chunk, index)
+
+        notes = self._map(instance, chunks, prompt_for)
+        return self._reduce_notes(instance, notes)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+
+class CircuitBreaker:
+    """Stop sending questions to a provider that keeps failing, then probe it again
+
+    Closed: calls go through and consecutive failures are counted.
+    Open: calls are short-circuited until the cool-down has passed.
+    Half-open: one probe call is let through; success closes the breaker,
+    failure opens it for another cool-down.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    _breakers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, name, failure_threshold=None, cooldown=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv("BREAKER_FAILURES", "3"))
+        self.cooldown = cooldown or float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_provider(cls, name):
+        """Return the breaker shared by every bot of one provider module"""
+        with cls._lock:
+            breaker = cls._breakers.get(name)
+            if breaker is None:
+                breaker = cls(name)
+                cls._breakers[name] = breaker
+            return breaker
+
+    def allow(self):
+        """Whether a call may go out now; in half-open state only one probe is allowed at a time"""
+        with self.lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """Give back a half-open probe that never reached the provider"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a probe through"""
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def describe(self):
+        """Short state text for the bot status line"""
+        if self.state == self.OPEN:
+            return f"circuit open, retry in {self.retry_in():.0f}s"
+        if self.state == self.HALF_OPEN:
+            return "probing"
+        if self.failures:
+            return f"ok, {self.failures} failure{'s' if self.failures > 1 else ''}"
+        return "ok"
\ No newline at end of file
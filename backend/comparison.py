@@ -0,0 +1,156 @@
+import re
+import zlib
+import numpy as np
+
+# Hashed feature space; collisions add about 0.01 of noise to a cosine at typical sentence lengths,
+# and it keeps the sentence x feature matrix at a few MB per hundred sentences
+N_FEATURES = 2 ** 13
+# Sentences compared per answer, which bounds the matrices for long reasoning answers
+MAX_SENTENCES_PER_BOT = 100
+# Sentences at least this similar are treated as the same point
+SIMILARITY_THRESHOLD = 0.45
+MIN_WORDS = 4
+MAX_COMMON_POINTS = 8
+MAX_UNIQUE_POINTS = 5
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)]|#+)\s*")
+WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "for", "with", "as", "by", "at", "from",
+    "is", "are", "was", "were", "be", "been", "it", "its", "this", "that", "these", "those", "can", "will",
+    "you", "your", "they", "their", "we", "our", "i", "also", "which", "so", "if", "then", "than"
+}
+
+class ResponseComparison:
+    """Find shared and model-unique points across bot answers without calling an LLM
+
+    Each answer is split into sentences, every sentence becomes a TF-IDF
+    weighted vector of hashed word uni/bigrams and character trigrams, and
+    each sentence joins the cluster whose members it matches best on average
+    cosine similarity, if that passes a threshold. Clusters spanning several
+    bots are shared points, clusters from one bot are that bot's unique points.
+    """
+
+    @staticmethod
+    def split_sentences(text):
+        """Split an answer into sentences, dropping list markers and fragments too short to be a point"""
+        sentences = []
+        for piece in SENTENCE_BOUNDARY.split(text or ""):
+            sentence = LIST_MARKER.sub("", piece).strip().strip("*_`").strip()
+            if len(sentence.split()) >= MIN_WORDS:
+                sentences.append(sentence)
+        return sentences
+
+    @staticmethod
+    def _features(sentence):
+        words = [word for word in WORD.findall(sentence.lower()) if word not in STOP_WORDS]
+        features = list(words)
+        features += [f"{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return [zlib.crc32(feature.encode("utf-8")) % N_FEATURES for feature in features]
+
+    @staticmethod
+    def vectorize(sentences):
+        """Return an L2-normalised TF-IDF matrix with one row per sentence"""
+        rows, columns = [], []
+        for row, sentence in enumerate(sentences):
+            indices = ResponseComparison._features(sentence)
+            rows.extend([row] * len(indices))
+            columns.extend(indices)
+
+        vectors = np.zeros((len(sentences), N_FEATURES), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), 1.0)
+
+        # Sublinear term frequency and smoothed inverse document frequency, in place to keep one matrix
+        document_frequency = np.count_nonzero(vectors, axis=0)
+        idf = (np.log((1 + len(sentences)) / (1 + document_frequency)) + 1).astype(np.float32)
+        np.log1p(vectors, out=vectors)
+        vectors *= idf
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        return vectors
+
+    @staticmethod
+    def cluster(vectors, threshold=SIMILARITY_THRESHOLD):
+        """Group rows by average linkage, returning (clusters, similarity matrix)
+
+        Each row joins the existing cluster with the highest mean similarity to
+        its members when that reaches the threshold, so two unrelated sentences
+        are never chained together through a third that resembles both.
+        """
+        similarity = vectors @ vectors.T
+        labels = np.zeros(len(vectors), dtype=np.int64)
+        sizes = []
+
+        for index in range(len(vectors)):
+            if sizes:
+                mean_similarity = np.bincount(labels[:index], weights=similarity[index, :index], minlength=len(sizes)) / sizes
+                best = int(np.argmax(mean_similarity))
+                if mean_similarity[best] >= threshold:
+                    labels[index] = best
+                    sizes[best] += 1
+                    continue
+            labels[index] = len(sizes)
+            sizes.append(1)
+
+        clusters = [[] for _ in sizes]
+        for index, label in enumerate(labels):
+            clusters[label].append(index)
+        return clusters, similarity
+
+    @staticmethod
+    def compare(responses, bot_names):
+        """Cluster the answers' sentences into common, shared and unique points
+
+        Returns {"common": [...], "shared": [...], "unique": {bot: [...]}} where
+        each point is {"text", "bots"}; "common" points were made by every bot.
+        """
+        sentences, owners = [], []
+        for bot_name in bot_names:
+            for sentence in ResponseComparison.split_sentences(responses.get(bot_name, ""))[:MAX_SENTENCES_PER_BOT]:
+                sentences.append(sentence)
+                owners.append(bot_name)
+
+        answered = [bot_name for bot_name in bot_names if bot_name in responses]
+        comparison = {"common": [], "shared": [], "unique": {bot_name: [] for bot_name in answered}}
+        if not sentences:
+            return comparison
+
+        clusters, similarity = ResponseComparison.cluster(ResponseComparison.vectorize(sentences))
+        # Keep points in the order they were first made
+        for members in sorted(clusters, key=min):
+            bots = [bot_name for bot_name in answered if any(owners[index] == bot_name for index in members)]
+            # The most central sentence stands for the whole cluster
+            representative = members[int(np.argmax(similarity[np.ix_(members, members)].sum(axis=1)))]
+            point = {"text": sentences[representative], "bots": bots}
+
+            if len(bots) == len(answered) and len(answered) > 1:
+                comparison["common"].append(point)
+            elif len(bots) > 1:
+                comparison["shared"].append(point)
+            else:
+                comparison["unique"][bots[0]].append(point)
+        return comparison
+
+    @staticmethod
+    def format(comparison):
+        """Render a comparison as plain text for the terminal and the journal"""
+        lines = ["Common points:"]
+        lines += [f"- {point['text']}" for point in comparison["common"][:MAX_COMMON_POINTS]] or ["- None found"]
+
+        if comparison["shared"]:
+            lines.append("\nShared by some models:")
+            lines += [f"- {point['text']} ({', '.join(point['bots'])})" for point in comparison["shared"][:MAX_COMMON_POINTS]]
+
+        lines.append("\nUnique points:")
+        for bot_name, points in comparison["unique"].items():
+            lines.append(f"{bot_name}:")
+            lines += [f"- {point['text']}" for point in points[:MAX_UNIQUE_POINTS]] or ["- Nothing beyond the shared points"]
+            if len(points) > MAX_UNIQUE_POINTS:
+                lines.append(f"- ... and {len(points) - MAX_UNIQUE_POINTS} more")
+        return "\n".join(lines)
\ No newline at end of file
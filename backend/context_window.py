@@ -0,0 +1,192 @@
+import os
+from summarizer import Summarizer
+from attachments import AttachmentManager
+
+# Prompt budgets in tokens, well under each model's context window so there is room for the answer
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4.1-nano-2025-04-14": 32000,
+    "gpt-4.1-mini-2025-04-14": 32000,
+    "gpt-4o-mini-2024-07-18": 32000,
+    "deepseek/deepseek-chat-v3-0324:free": 16000,
+    "deepseek/deepseek-r1:free": 16000,
+    "deepseek/deepseek-r1-zero:free": 16000,
+    "gemini-2.0-flash": 32000,
+    "gemini-1.5-flash": 32000,
+    "gemini-2.5-flash-preview-04-17": 32000,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 8000,
+    "meta-llama/llama-4-scout-17b-16e-instruct": 8000,
+    "llama-3.3-70b-versatile": 8000,
+    "mistral-small-latest": 16000,
+    "pixtral-12b-2409": 16000,
+    "open-mistral-nemo": 16000,
+    "qwen/qwen3-235b-a22b:free": 16000,
+    "qwen/qwen3-30b-a3b:free": 16000,
+    "qwen/qwen2.5-vl-72b-instruct:free": 16000,
+    "qwen/qwen-2.5-coder-32b-instruct:free": 16000
+}
+
+DEFAULT_TOKEN_BUDGET = 8000
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+ATTACHMENT_PLACEHOLDER = "[Attachment omitted: already answered]"
+FILE_CONTENT_MARKER = "\n\nFile content:\n"
+
+class ContextWindow:
+    """Keep a bot's history within a token budget
+
+    The system message and the most recent turns are always kept. Older turns are
+    folded into a rolling summary written by a cheap model, and attachments that
+    have already been answered are replaced by a short placeholder.
+    """
+
+    def __init__(self, model, token_budget=None, keep_turns=4):
+        if token_budget is None and os.getenv("CONTEXT_TOKEN_BUDGET"):
+            token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET"))
+
+        self.token_budget = token_budget or MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+        self.keep_turns = keep_turns
+
+    def compact(self, history):
+        """Shrink a history in place before its next question is sent
+
+        Collapsed messages are replaced rather than edited, since the turns may
+        be shared with other copies of the history and carry a cached encoding.
+        """
+        for index, message in enumerate(history):
+            collapsed = self._collapse_attachments(message)
+            if collapsed is not message:
+                history[index] = collapsed
+
+        if self.count_tokens(history) <= self.token_budget:
+            return
+
+        head, summary, turns = self._split(history)
+
+        folded = []
+        while len(turns) > self.keep_turns and self.count_tokens(head + summary + sum(turns, [])) > self.token_budget:
+            folded.extend(turns.pop(0))
+
+        if not folded:
+            return
+
+        previous = _text(summary[0])[len(SUMMARY_PREFIX):] if summary else ""
+        transcript = "\n".join(f"{_role(message)}: {_text(message)}" for message in folded)
+
+        condensed = Summarizer.condense_history(transcript, previous)
+        if not condensed:
+            # Without the summarizer keep a clipped tail rather than losing everything
+            condensed = (previous + "\n" + transcript).strip()[-2000:]
+
+        history[:] = head + self._summary_messages(history, condensed) + sum(turns, [])
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Cheap token estimate, about four characters per token"""
+        return len(text) // 4 + 1
+
+    def count_tokens(self, history):
+        return sum(self.estimate_tokens(_text(message)) for message in history)
+
+    @staticmethod
+    def _split(history):
+        """Split a history into system messages, the rolling summary and user-led turns"""
+        head = []
+        index = 0
+        while index < len(history) and _role(history[index]) == "system" and not _text(history[index]).startswith(SUMMARY_PREFIX):
+            head.append(history[index])
+            index += 1
+
+        summary = []
+        if index < len(history) and _text(history[index]).startswith(SUMMARY_PREFIX):
+            summary.append(history[index])
+            index += 1
+            # Gemini summaries come with the model's acknowledgement
+            if index < len(history) and _role(history[index]) == "model":
+                summary.append(history[index])
+                index += 1
+
+        turns = []
+        for message in history[index:]:
+            if _role(message) == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+
+        return head, summary, turns
+
+    @staticmethod
+    def _summary_messages(history, summary_text):
+        """Build the summary entries in the same format as the rest of the history"""
+        if any("parts" in message for message in history if isinstance(message, dict)):
+            # Gemini histories have no system role, so the summary is an acknowledged user turn
+            return [
+                {"role": "user", "parts": [{"text": SUMMARY_PREFIX + summary_text}]},
+                {"role": "model", "parts": [{"text": "Understood."}]}
+            ]
+        return [{"role": "system", "content": SUMMARY_PREFIX + summary_text}]
+
+    @staticmethod
+    def _collapse_attachments(message):
+        """Return the message with inline images, documents and file contents replaced by a placeholder
+
+        Live file handles are kept. The message itself is returned when there is nothing to collapse.
+        """
+        if not isinstance(message, dict) or _role(message) != "user":
+            return message
+
+        if "parts" in message:
+            if not any("inline_data" in part or _expired(part) for part in message["parts"]):
+                return message
+            return dict(message, parts=[
+                {"text": ATTACHMENT_PLACEHOLDER} if "inline_data" in part or _expired(part) else part
+                for part in message["parts"]
+            ])
+
+        content = message.get("content")
+        if isinstance(content, str):
+            if FILE_CONTENT_MARKER in content:
+                return dict(message, content=content.split(FILE_CONTENT_MARKER)[0] + "\n\n" + ATTACHMENT_PLACEHOLDER)
+        elif isinstance(content, list):
+            collapsed = []
+            for part in content:
+                if part.get("type") in ("image_url", "image", "document") or _expired(part):
+                    collapsed.append({"type": "text", "text": ATTACHMENT_PLACEHOLDER})
+                elif part.get("type") == "text" and FILE_CONTENT_MARKER in part["text"]:
+                    collapsed.append({"type": "text", "text": part["text"].split(FILE_CONTENT_MARKER)[0] + "\n\n" + ATTACHMENT_PLACEHOLDER})
+                else:
+                    collapsed.append(part)
+            if collapsed != content:
+                return dict(message, content=collapsed)
+        return message
+
+def _expired(part):
+    """Whether a part refers to an uploaded file whose handle is no longer usable"""
+    if "file_data" in part:
+        return not AttachmentManager.is_live(part["file_data"]["file_uri"])
+    if part.get("type") == "file":
+        return not AttachmentManager.is_live(part["file"]["file_id"])
+    return False
+
+def _role(message):
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+def _text(message):
+    """Flatten a history entry of any adapter's format into plain text"""
+    if isinstance(message, dict):
+        content = message.get("content", message.get("parts"))
+    else:
+        content = getattr(message, "content", None)
+
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+
+    texts = []
+    for part in content:
+        if isinstance(part, dict):
+            texts.append(part.get("text") or str(part))
+        else:
+            texts.append(str(part))
+    return "\n".join(texts)
\ No newline at end of file
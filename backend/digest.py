@@ -0,0 +1,263 @@
+import io
+import csv
+import json
+
+import openpyxl
+
+# Statistics are computed over at most this many rows; the row count still covers the whole file
+MAX_STAT_ROWS = 100_000
+SAMPLE_ROWS = 5
+TOP_VALUES = 3
+MAX_VALUE_CHARS = 60
+MAX_OUTLINE_DEPTH = 4
+MAX_OUTLINE_KEYS = 25
+NULL_VALUES = {"", "na", "n/a", "nan", "null", "none", "-"}
+
+CSV_MIME_TYPES = ("text/csv", "application/csv", "text/tab-separated-values")
+JSON_MIME_TYPES = ("application/json",)
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _clip(value):
+    value = str(value)
+    return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS - 3] + "..."
+
+def _number(value):
+    if abs(value) >= 1e15:
+        return f"{value:.4g}"
+    if value == int(value):
+        return f"{int(value):,}"
+    return f"{value:,.6g}"
+
+class DataDigest:
+    """Parse a CSV, XLSX or JSON upload once and describe it compactly for the bots
+
+    The digest gives the schema, row counts, per-column statistics, distinct
+    counts and a few representative rows, which is usually all a model needs
+    to answer questions about an export and costs a tiny fraction of the
+    tokens of the raw file.
+    """
+
+    @staticmethod
+    def is_structured(mime_type):
+        return mime_type in CSV_MIME_TYPES + JSON_MIME_TYPES or mime_type == XLSX_MIME_TYPE
+
+    @staticmethod
+    def build(upload):
+        """Return the digest text for an upload, or None when it isn't structured data"""
+        if upload.mime_type in CSV_MIME_TYPES:
+            return DataDigest._digest_csv(upload)
+        if upload.mime_type in JSON_MIME_TYPES:
+            return DataDigest._digest_json(upload)
+        if upload.mime_type == XLSX_MIME_TYPE:
+            sheets = DataDigest._read_sheets(DataDigest._source(upload, binary=True))
+            parts = [DataDigest.describe_table(f"{upload.name}, sheet {name}", header, rows, count)
+                     for name, (header, rows, count) in sheets.items()]
+            return "\n\n".join(parts) or f"{upload.name} has no sheets with data."
+        return None
+
+    @staticmethod
+    def sheets_as_csv(upload):
+        """Every sheet of a workbook rendered as CSV, for when the full data is wanted"""
+        parts = []
+        for name, (header, rows, _) in DataDigest._read_sheets(DataDigest._source(upload, binary=True), limit=None).items():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(header)
+            writer.writerows(rows)
+            parts.append(f"Sheet: {name}\n{buffer.getvalue()}")
+        return "\n".join(parts)
+
+    @staticmethod
+    def _source(upload, binary=False):
+        """A file object over the bytes already read, or over the file on disk for large uploads"""
+        if upload.data is None:
+            if binary:
+                return open(upload.path, "rb")
+            return open(upload.path, "r", encoding="utf-8", errors="replace", newline="")
+        if binary:
+            return io.BytesIO(upload.data)
+        return io.StringIO(upload.data.decode("utf-8", errors="replace"), newline="")
+
+    @staticmethod
+    def _digest_csv(upload):
+        with DataDigest._source(upload) as file:
+            sample = file.read(64 * 1024)
+            file.seek(0)
+            try:
+                # Only whole lines, and only the usual delimiters, or the sniffer guesses wildly
+                dialect = csv.Sniffer().sniff(sample[:sample.rfind("\n") + 1] or sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+
+            reader = csv.reader(file, dialect)
+            header = next(reader, [])
+            rows = []
+            count = 0
+            for row in reader:
+                count += 1
+                if count <= MAX_STAT_ROWS:
+                    rows.append(row)
+        return DataDigest.describe_table(upload.name, header, rows, count)
+
+    @staticmethod
+    def _read_sheets(file, limit=MAX_STAT_ROWS):
+        """Read each worksheet as (header, rows, row count)"""
+        with file:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+            sheets = {}
+            try:
+                for sheet in workbook.worksheets:
+                    values = sheet.iter_rows(values_only=True)
+                    header = ["" if cell is None else str(cell) for cell in next(values, ())]
+                    rows = []
+                    count = 0
+                    for row in values:
+                        if all(cell is None for cell in row):
+                            continue
+                        count += 1
+                        if limit is None or count <= limit:
+                            rows.append(["" if cell is None else str(cell) for cell in row])
+                    if header or rows:
+                        sheets[sheet.title] = (header, rows, count)
+            finally:
+                workbook.close()
+        return sheets
+
+    @staticmethod
+    def _digest_json(upload):
+        with DataDigest._source(upload) as file:
+            data = json.load(file)
+
+        lines = [f"Digest of {upload.name} (JSON)", "Structure:"]
+        lines += DataDigest._outline(data)
+
+        path, records = DataDigest._find_records(data)
+        if records:
+            columns = list(dict.fromkeys(key for record in records[:MAX_STAT_ROWS] for key in record))
+            rows = [[DataDigest._cell(record.get(column)) for column in columns] for record in records[:MAX_STAT_ROWS]]
+            lines += ["", DataDigest.describe_table(f"records at {path}", columns, rows, len(records))]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _cell(value):
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+
+    @staticmethod
+    def _find_records(data, path="$", depth=0):
+        """The largest list of objects within the top levels of a JSON document"""
+        if isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+            return path, data
+        best = (None, None)
+        if isinstance(data, dict) and depth < 2:
+            for key, value in data.items():
+                found = DataDigest._find_records(value, f"{path}.{key}", depth + 1)
+                if found[1] and (best[1] is None or len(found[1]) > len(best[1])):
+                    best = found
+        return best
+
+    @staticmethod
+    def _outline(value, indent="  ", depth=0):
+        """Describe the shape of a JSON value: object keys, array lengths and scalar types"""
+        if isinstance(value, dict):
+            if depth >= MAX_OUTLINE_DEPTH:
+                return [f"{indent}object with {len(value)} keys"]
+            lines = []
+            for key in list(value)[:MAX_OUTLINE_KEYS]:
+                child = value[key]
+                if isinstance(child, (dict, list)):
+                    lines.append(f"{indent}{key}: {DataDigest._kind(child)}")
+                    lines += DataDigest._outline(child, indent + "  ", depth + 1)
+                else:
+                    lines.append(f"{indent}{key}: {DataDigest._kind(child)} = {_clip(json.dumps(child, ensure_ascii=False))}")
+            if len(value) > MAX_OUTLINE_KEYS:
+                lines.append(f"{indent}... and {len(value) - MAX_OUTLINE_KEYS} more keys")
+            return lines
+        if isinstance(value, list):
+            if not value or depth >= MAX_OUTLINE_DEPTH:
+                return []
+            # The first element stands for the rest; lists of records are described as a table
+            first = value[0]
+            if isinstance(first, dict) and depth > 0:
+                return [f"{indent}items: object with keys {', '.join(map(str, list(first)[:MAX_OUTLINE_KEYS]))}"]
+            if isinstance(first, (dict, list)):
+                return [f"{indent}items: {DataDigest._kind(first)}"] + DataDigest._outline(first, indent + "  ", depth + 1)
+            return [f"{indent}items: {DataDigest._kind(first)}, e.g. {_clip(json.dumps(value[:3], ensure_ascii=False))}"]
+        return [f"{indent}{DataDigest._kind(value)} = {_clip(json.dumps(value, ensure_ascii=False))}"]
+
+    @staticmethod
+    def _kind(value):
+        if isinstance(value, dict):
+            return f"object ({len(value)} keys)"
+        if isinstance(value, list):
+            return f"array ({len(value):,} items)"
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, (int, float)):
+            return "number"
+        return "null" if value is None else "string"
+
+    @staticmethod
+    def describe_table(title, header, rows, count):
+        """Schema, per-column statistics and sample rows for a table of string cells"""
+        width = max([len(header)] + [len(row) for row in rows[:1000]])
+        header = list(header) + [f"column_{index + 1}" for index in range(len(header), width)]
+        lines = [f"Digest of {title} ({count:,} rows x {width} columns"
+                 + (f"; statistics over the first {len(rows):,} rows)" if count > len(rows) else ")")]
+        if not rows:
+            lines.append("Columns: " + ", ".join(header))
+            return "\n".join(lines)
+
+        # Imported here so that loading an upload doesn't pull in NumPy before a table needs it
+        import numpy as np
+
+        # One padded array of cells, so each column can be summarised with vectorised operations
+        table = np.array([row[:width] + [""] * (width - len(row)) for row in rows], dtype=object)
+        lines.append("Columns:")
+        for index, name in enumerate(header):
+            lines.append(f"- {DataDigest._describe_column(name, table[:, index])}")
+
+        lines.append("Sample rows:")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(header)
+        # The first rows plus rows spread evenly through the rest
+        picks = np.unique(np.concatenate([np.arange(min(2, len(rows))),
+                                          np.linspace(0, len(rows) - 1, SAMPLE_ROWS - 2).astype(int)]))
+        writer.writerows([[_clip(cell) for cell in table[pick]] for pick in picks])
+        lines.append(buffer.getvalue().rstrip("\n"))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _describe_column(name, cells):
+        import numpy as np
+        
+        cells = np.char.strip(cells.astype(str))
+        empty = np.isin(np.char.lower(cells), list(NULL_VALUES))
+        values = cells[~empty]
+        counts = f"{len(values):,} filled, {int(empty.sum()):,} empty"
+        if not len(values):
+            return f"{name}: empty"
+
+        try:
+            numbers = values.astype(np.float64)
+        except ValueError:
+            numbers = None
+
+        if numbers is not None:
+            distinct = len(np.unique(numbers))
+            low, median, high = np.percentile(numbers, [25, 50, 75])
+            kind = "integer" if np.all(numbers == np.round(numbers)) else "number"
+            return (f"{name} ({kind}): {counts}, {distinct:,} distinct; min {_number(numbers.min())}, "
+                    f"max {_number(numbers.max())}, mean {_number(numbers.mean())}, std {_number(numbers.std())}, "
+                    f"quartiles {_number(low)} / {_number(median)} / {_number(high)}")
+
+        unique, frequency = np.unique(values, return_counts=True)
+        top = np.argsort(-frequency, kind="stable")[:TOP_VALUES]
+        common = ", ".join(f'"{_clip(unique[i])}" ({frequency[i]:,})' for i in top)
+        lengths = np.char.str_len(values)
+        return (f"{name} (text): {counts}, {len(unique):,} distinct; most common {common}; "
+                f"length {lengths.min()}-{lengths.max()}")
\ No newline at end of file
@@ -0,0 +1,393 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from file_handler import FileHandler, UnsupportedFileError
+from circuit_breaker import CircuitBreaker
+from instrumentation import percentile
+from registry import ProviderRegistry
+from chunker import ChunkedQuery
+
+# Hedge after this long until a model has enough first-token samples for a p95
+HEDGE_AFTER_SECONDS = float(os.getenv("HEDGE_AFTER_SECONDS", "8"))
+HEDGE_MIN_SAMPLES = 5
+
+class Attempt:
+    """One bot's call for one turn, made on a scratch copy of the bot instance
+
+    The worker commits the copy back to the real instance only if the
+    dispatcher hasn't given up on it, so a call that overruns its deadline
+    can't change the history after the turn has moved on. The scratch copy
+    carries the cancel event as "cancel", which adapters hand to their rate
+    scheduler so a call still queued for budget is never sent.
+    """
+
+    def __init__(self, instance):
+        self.cancel = threading.Event()
+        self.scratch = dict(instance, history=instance["history"].copy(), cancel=self.cancel)
+        self.lock = threading.Lock()
+        self.committed = False
+
+    def commit(self, instance):
+        with self.lock:
+            if self.cancel.is_set():
+                return False
+            instance.update(self.scratch)
+            instance.pop("cancel", None)
+            self.committed = True
+            return True
+
+    def abandon(self):
+        """Cancel the call unless its answer has already been committed"""
+        with self.lock:
+            if self.committed:
+                return False
+            self.cancel.set()
+            return True
+
+class Dispatcher:
+    """Send each question to every bot at once and collect the answers"""
+
+    def __init__(self, max_workers=None, metrics=None, deadline=None):
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bot")
+        # A worker stays taken until its call returns, even after the dispatcher has given up on it
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.metrics = metrics
+        # Seconds each bot gets per question, 0 for no limit; a bot's own "deadline" takes precedence
+        self.deadline = deadline if deadline is not None else float(os.getenv("BOT_DEADLINE_SECONDS", "90"))
+
+    def dispatch(self, bots, question, upload=None, file_prompt=None, on_result=None, on_delta=None, first=None):
+        """Ask all bots concurrently and return their results in the order of `bots`
+
+        `on_result(bot_name, result)` is called as soon as each bot finishes, so
+        answers can be shown in arrival order while the returned dict stays stable.
+        When `on_delta(bot_name, text)` is given, bots with a stream function are
+        streamed and every delta is passed to it as it arrives. Bots that miss
+        their deadline get a "timeout" result and their history is left as it
+        was; bots whose provider circuit is open are skipped, and so are bots
+        asked while every worker is still held by earlier calls, such as calls
+        to a hung provider that were abandoned but haven't returned, rather than
+        queueing behind them. With `first`, the
+        call returns once that many bots have answered and the others are
+        cancelled the same way, with a "cancelled" result.
+        """
+        results = {}
+        futures = {}
+        attempts = {}
+        deadlines = {}
+        start = time.monotonic()
+
+        for bot_name, bot_data in bots.items():
+            if upload:
+                module_name = bot_data["module_name"]
+                model = bot_data["instance"]["model"]
+
+                is_compatible, error_msg = FileHandler.is_file_compatible(
+                    module_name, model, upload.path, upload.mime_type
+                )
+
+                if not is_compatible:
+                    results[bot_name] = {"status": "incompatible", "text": error_msg, "latency": 0.0}
+                    if on_result:
+                        on_result(bot_name, results[bot_name])
+                    continue
+
+            if not self.slots.acquire(blocking=False):
+                results[bot_name] = {"status": "skipped", "text": "Skipped, every worker is still busy with earlier calls", "latency": 0.0}
+                if on_result:
+                    on_result(bot_name, results[bot_name])
+                continue
+
+            breaker = CircuitBreaker.for_provider(bot_data["module_name"])
+            if not breaker.allow():
+                self.slots.release()
+                results[bot_name] = {"status": "skipped", "text": f"Skipped, {breaker.describe()}", "latency": 0.0}
+                if on_result:
+                    on_result(bot_name, results[bot_name])
+                continue
+
+            attempts[bot_name] = Attempt(bot_data["instance"])
+            deadline = bot_data.get("deadline", self.deadline)
+            deadlines[bot_name] = start + deadline if deadline else None
+            hedge = self.hedge_plan(bot_name, bot_data) if bot_data.get("hedge") else None
+            future = self.executor.submit(
+                self._run, bot_name, bot_data, attempts[bot_name], question, upload, file_prompt, on_delta, hedge
+            )
+            future.add_done_callback(lambda _: self.slots.release())
+            futures[future] = bot_name
+
+        pending = set(futures)
+        while pending:
+            upcoming = [deadlines[futures[future]] for future in pending if deadlines[futures[future]] is not None]
+            timeout = max(0.0, min(upcoming) - time.monotonic()) if upcoming else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                self._collect(bots, futures[future], future.result(), results, on_result)
+
+            if first and sum(1 for result in results.values() if self._usable(result)) >= first:
+                for future in list(pending):
+                    bot_name = futures[future]
+                    if attempts[bot_name].abandon():
+                        pending.discard(future)
+                        result = {
+                            "status": "cancelled",
+                            "text": f"Cancelled, {first} answer{'s' if first > 1 else ''} already in",
+                            "latency": time.monotonic() - start,
+                            "model": bots[bot_name]["instance"]["model"]
+                        }
+                        self._collect(bots, bot_name, result, results, on_result)
+
+            now = time.monotonic()
+            for future in list(pending):
+                bot_name = futures[future]
+                if deadlines[bot_name] is None or now < deadlines[bot_name]:
+                    continue
+                # A call that committed just before its deadline is about to return, so keep waiting for it
+                if attempts[bot_name].abandon():
+                    pending.discard(future)
+                    result = {
+                        "status": "timeout",
+                        "text": f"Error: no answer within {deadlines[bot_name] - start:g}s",
+                        "latency": now - start,
+                        "model": bots[bot_name]["instance"]["model"]
+                    }
+                    self._collect(bots, bot_name, result, results, on_result)
+
+        return {bot_name: results[bot_name] for bot_name in bots if bot_name in results}
+
+    @staticmethod
+    def _usable(result):
+        return result["status"] == "answer" and not result["text"].startswith("Error")
+
+    def _collect(self, bots, bot_name, result, results, on_result):
+        """Feed a finished result to the breaker, metrics and callback"""
+        breaker = CircuitBreaker.for_provider(bots[bot_name]["module_name"])
+        if result.get("cached") or result["status"] in ("cancelled", "incompatible"):
+            # The provider wasn't asked, or was cut off, so a probe in flight tells us nothing
+            breaker.release()
+        elif self._usable(result):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+        results[bot_name] = result
+        if self.metrics:
+            self.metrics.record(bot_name, result)
+        if on_result:
+            on_result(bot_name, result)
+
+    def hedge_plan(self, bot_name, bot_data):
+        """Return (seconds to wait for a first token, backup model), or None without a sibling model
+
+        The wait is the p95 time to first token seen for this bot and model, so
+        roughly one call in twenty gets a backup request.
+        """
+        model = bot_data["instance"]["model"]
+        models = ProviderRegistry.load(bot_data["module_name"]).get_available_models().values()
+        siblings = [sibling for sibling in models if sibling != model]
+        if not siblings:
+            return None
+
+        samples = self.metrics.ttft_samples(bot_name, model) if self.metrics else []
+        hedge_after = percentile(samples, 0.95) if len(samples) >= HEDGE_MIN_SAMPLES else HEDGE_AFTER_SECONDS
+        return hedge_after, siblings[0]
+
+    @staticmethod
+    def _run(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta, hedge=None):
+        if bot_data.get("context"):
+            # Compacting the scratch copy before the send keeps a slow summarizer call under the
+            # bot's deadline; if the attempt is abandoned the compaction is simply redone next turn
+            bot_data["context"].compact(attempt.scratch["history"])
+        if ChunkedQuery.applies(bot_data, upload):
+            result = Dispatcher._ask_chunked(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta)
+        elif hedge:
+            result = Dispatcher._ask_hedged(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta, *hedge)
+        elif on_delta and bot_data.get("stream_function"):
+            result = Dispatcher._ask_stream(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta)
+        else:
+            result = Dispatcher._ask(bot_data, attempt, question, upload, file_prompt)
+        return Dispatcher._finish(bot_data, attempt, result)
+
+    @staticmethod
+    def _ask(bot_data, attempt, question, upload, file_prompt):
+        """Run one bot's ask function and time it"""
+        attempt.scratch.pop("last_call", None)
+        start = time.perf_counter()
+        try:
+            answer = bot_data["ask_function"](
+                attempt.scratch,
+                question,
+                upload=upload,
+                file_prompt=file_prompt
+            )
+            result = {"status": "answer", "text": answer, "latency": time.perf_counter() - start}
+        except UnsupportedFileError as e:
+            result = {"status": "incompatible", "text": str(e), "latency": time.perf_counter() - start}
+        except Exception as e:
+            result = {"status": "error", "text": str(e), "latency": time.perf_counter() - start}
+        return result
+
+    @staticmethod
+    def _ask_stream(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta):
+        """Drain one bot's stream function, forwarding deltas and timing the first one"""
+        attempt.scratch.pop("last_call", None)
+        start = time.perf_counter()
+        ttft = None
+        deltas = []
+        stream = None
+        try:
+            stream = bot_data["stream_function"](
+                attempt.scratch,
+                question,
+                upload=upload,
+                file_prompt=file_prompt
+            )
+            for delta in stream:
+                # Stop reading once the dispatcher has moved on, which also closes the provider stream
+                if attempt.cancel.is_set():
+                    break
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                deltas.append(delta)
+                on_delta(bot_name, delta)
+            result = {"status": "answer", "text": "".join(deltas), "latency": time.perf_counter() - start, "ttft": ttft}
+        except UnsupportedFileError as e:
+            result = {"status": "incompatible", "text": str(e), "latency": time.perf_counter() - start, "ttft": ttft}
+        except Exception as e:
+            result = {"status": "error", "text": str(e), "latency": time.perf_counter() - start, "ttft": ttft}
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+        return result
+
+    @staticmethod
+    def _ask_chunked(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta):
+        """Answer over a file too large to inline by querying its chunks, then asking once with the notes"""
+        start = time.perf_counter()
+        query = ChunkedQuery(bot_data, upload, question, file_prompt, cancel=attempt.cancel)
+        try:
+            notes = query.collect_notes(attempt.scratch)
+        except Exception as e:
+            return {"status": "error", "text": str(e), "latency": time.perf_counter() - start}
+
+        mapped = time.perf_counter() - start
+        if on_delta and bot_data.get("stream_function"):
+            result = Dispatcher._ask_stream(bot_name, bot_data, attempt, query.reduce_prompt(notes), None, None, on_delta)
+        else:
+            result = Dispatcher._ask(bot_data, attempt, query.reduce_prompt(notes), None, None)
+
+        # The time spent reading the chunks is part of the answer's latency
+        result["chunks"] = query.chunks
+        result["latency"] += mapped
+        if result.get("ttft") is not None:
+            result["ttft"] += mapped
+        return result
+
+    @staticmethod
+    def _ask_hedged(bot_name, bot_data, attempt, question, upload, file_prompt, on_delta, hedge_after, backup_model):
+        """Ask the configured model and, if it shows no first token within `hedge_after`, a backup model too
+
+        Each candidate runs on its own copy of the scratch instance. The first
+        one to produce a usable token (or, without streaming, a usable answer)
+        wins, its deltas are forwarded and the other is cancelled. The winner's
+        history is kept, but the bot stays on its configured model.
+        """
+        streaming = bool(on_delta and bot_data.get("stream_function"))
+        condition = threading.Condition()
+        candidates = []
+        results = {}
+        state = {"winner": None}
+
+        def usable(text):
+            return not text.startswith("Error")
+
+        def choose(candidate):
+            # Called with the condition held
+            state["winner"] = candidate
+            for other in candidates:
+                if other is not candidate:
+                    other.cancel.set()
+            condition.notify_all()
+
+        def launch(model):
+            candidate = Attempt(attempt.scratch)
+            candidate.scratch["model"] = model
+            candidate.started = time.perf_counter()
+            candidates.append(candidate)
+
+            def forward(name, delta):
+                with condition:
+                    if state["winner"] is None and usable(delta):
+                        choose(candidate)
+                    won = state["winner"] is candidate
+                if won:
+                    on_delta(name, delta)
+
+            def run():
+                if streaming:
+                    result = Dispatcher._ask_stream(bot_name, bot_data, candidate, question, upload, file_prompt, forward)
+                else:
+                    result = Dispatcher._ask(bot_data, candidate, question, upload, file_prompt)
+                with condition:
+                    results[candidate] = result
+                    if (state["winner"] is None and not candidate.cancel.is_set()
+                            and result["status"] == "answer" and usable(result["text"])):
+                        choose(candidate)
+                    condition.notify_all()
+
+            threading.Thread(target=run, name=f"hedge-{bot_name}", daemon=True).start()
+            return candidate
+
+        def settled():
+            winner = state["winner"]
+            return (winner is not None and winner in results) or len(results) == len(candidates)
+
+        primary = launch(attempt.scratch["model"])
+        with condition:
+            condition.wait_for(lambda: state["winner"] is not None or primary in results, timeout=hedge_after)
+            # No token yet, or the primary already failed: the backup doubles as a fallback
+            hedge = state["winner"] is None and not attempt.cancel.is_set()
+        if hedge:
+            launch(backup_model)
+
+        with condition:
+            while not settled():
+                condition.wait(timeout=0.5)
+                if attempt.cancel.is_set():
+                    for candidate in candidates:
+                        candidate.cancel.set()
+                    return {"status": "timeout", "text": "Error: cancelled", "latency": 0.0}
+
+            chosen = state["winner"] or primary
+            result = results[chosen]
+
+        model = attempt.scratch["model"]
+        attempt.scratch.update(chosen.scratch)
+        attempt.scratch["model"] = model
+        attempt.scratch["cancel"] = attempt.cancel
+        if chosen is not primary:
+            # Time the backup from when the question was first sent, as the user experienced it
+            offset = chosen.started - primary.started
+            result["latency"] += offset
+            if result.get("ttft") is not None:
+                result["ttft"] += offset
+            result["hedged"] = True
+        return result
+
+    @staticmethod
+    def _finish(bot_data, attempt, result):
+        """Attach the adapter's call details and commit the turn"""
+        call = attempt.scratch.pop("last_call", None) or {}
+        result.update(call)
+        result.setdefault("model", attempt.scratch["model"])
+
+        # Failed calls are not committed, so the question doesn't linger in the history unanswered
+        if Dispatcher._usable(result):
+            attempt.commit(bot_data["instance"])
+        return result
+
+    def shutdown(self):
+        """Stop the worker threads once the session is over"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+PDF_MIME_TYPE = "application/pdf"
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+CACHE_DIR = os.getenv("EXTRACT_CACHE_DIR", ".extract_cache")
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0")) or min(os.cpu_count() or 1, 8)
+# Pages are handed to the workers in batches so each worker parses the document once per batch
+MIN_PAGES_PER_BATCH = 8
+
+def _count_pdf_pages(path):
+    from PyPDF2 import PdfReader
+    return len(PdfReader(path).pages)
+
+def _extract_pdf_pages(path, pages):
+    """Worker process: text of the given 1-based pages of a PDF"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    return [(page, reader.pages[page - 1].extract_text() or "") for page in pages]
+
+def _extract_docx_pages(path):
+    """Worker process: a DOCX's paragraphs and tables in document order, split at its page breaks"""
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    document = docx.Document(path)
+    pages = [[]]
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            # Breaks Word inserted or last rendered both start a new page
+            if 'w:type="page"' in element.xml or "lastRenderedPageBreak" in element.xml:
+                if pages[-1]:
+                    pages.append([])
+            pages[-1].append(Paragraph(element, document).text)
+        elif tag == "tbl":
+            table = Table(element, document)
+            pages[-1] += ["\t".join(cell.text.strip() for cell in row.cells) for row in table.rows]
+    return [(page, "\n".join(lines).strip()) for page, lines in enumerate(pages, 1)]
+
+class DocumentExtractor:
+    """Extract PDF and DOCX text page by page in worker processes, caching each page on disk
+
+    Pages are stored under <cache>/<sha256>/ so the same document is only
+    ever parsed once, even across sessions, and an interrupted extraction
+    picks up at the pages it hadn't reached.
+    """
+
+    _pool = None
+    _pending = {}
+    _lock = threading.Lock()
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extract")
+
+    @staticmethod
+    def is_document(mime_type):
+        return mime_type in (PDF_MIME_TYPE, DOCX_MIME_TYPE)
+
+    @classmethod
+    def _get_pool(cls):
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+            return cls._pool
+
+    @staticmethod
+    def _directory(upload):
+        return os.path.join(CACHE_DIR, upload.sha256)
+
+    @staticmethod
+    def _page_path(directory, page):
+        return os.path.join(directory, f"{page:05d}.txt")
+
+    @staticmethod
+    def _write(path, text):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temporary, path)
+
+    @classmethod
+    def prefetch(cls, upload):
+        """Start extracting in the background, so the text is ready by the time the bots need it"""
+        if not cls.is_document(upload.mime_type):
+            return None
+        with cls._lock:
+            future = cls._pending.get(upload.sha256)
+            if future is None:
+                future = cls._executor.submit(cls._extract, upload)
+                cls._pending[upload.sha256] = future
+                future.add_done_callback(lambda _: cls._forget(upload.sha256))
+        return future
+
+    @classmethod
+    def _forget(cls, sha256):
+        with cls._lock:
+            cls._pending.pop(sha256, None)
+
+    @classmethod
+    def page_paths(cls, upload):
+        """The cached text file of every page, extracting whatever isn't cached yet"""
+        return cls.prefetch(upload).result()
+
+    @classmethod
+    def _extract(cls, upload):
+        directory = cls._directory(upload)
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "pages.json")
+
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as file:
+                count = json.load(file)["pages"]
+        elif upload.mime_type == DOCX_MIME_TYPE:
+            # A DOCX has no page table to read up front, so it is extracted in one go
+            pages = cls._get_pool().submit(_extract_docx_pages, upload.path).result()
+            for page, text in pages:
+                cls._write(cls._page_path(directory, page), text)
+            count = len(pages)
+            cls._write(index_path, json.dumps({"pages": count}))
+        else:
+            count = cls._get_pool().submit(_count_pdf_pages, upload.path).result()
+            cls._write(index_path, json.dumps({"pages": count}))
+
+        missing = [page for page in range(1, count + 1) if not os.path.exists(cls._page_path(directory, page))]
+        if missing:
+            size = max(MIN_PAGES_PER_BATCH, math.ceil(len(missing) / EXTRACT_WORKERS))
+            pool = cls._get_pool()
+            futures = [pool.submit(_extract_pdf_pages, upload.path, missing[start:start + size])
+                       for start in range(0, len(missing), size)]
+            for future in futures:
+                for page, text in future.result():
+                    cls._write(cls._page_path(directory, page), text)
+
+        return [cls._page_path(directory, page) for page in range(1, count + 1)]
+
+    @classmethod
+    def iter_lines(cls, upload):
+        """The document's text line by line, with a marker at the top of each page"""
+        paths = cls.page_paths(upload)
+        for page, path in enumerate(paths, 1):
+            if len(paths) > 1:
+                yield f"--- Page {page} ---\n"
+            with open(path, "r", encoding="utf-8") as file:
+                yield from file
+            yield "\n\n"
+
+    @classmethod
+    def text(cls, upload):
+        """The whole document as text, raising ValueError if it has none (e.g. a scanned PDF)"""
+        try:
+            paths = cls.page_paths(upload)
+        except ImportError as e:
+            raise ValueError(f"Reading {upload.name} needs the {e.name or e} package (pip install -r requirements.txt).")
+        except Exception as e:
+            raise ValueError(f"Could not read {upload.name}: {e}")
+        if not any(os.path.getsize(path) for path in paths):
+            raise ValueError(f"No text could be extracted from {upload.name}; it may be a scanned document.")
+        return "".join(cls.iter_lines(upload)).strip()
+
+    @classmethod
+    def estimated_tokens(cls, upload):
+        """Rough token count of the extracted text, or 0 if it can't be extracted"""
+        try:
+            return sum(os.path.getsize(path) for path in cls.page_paths(upload)) // 4
+        except Exception:
+            return 0
+
+    @classmethod
+    def shutdown(cls):
+        """Stop the extraction workers when the session ends"""
+        cls._executor.shutdown(wait=False, cancel_futures=True)
+        with cls._lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = ("the", "model", "answer", "covers", "this", "point", "with", "some", "detail", "and", "context")
+
+class FakeProviderConfig:
+    """Latency, streaming and error behaviour of the fake provider"""
+
+    def __init__(self, latency_ms=800.0, latency_sigma=0.4, tokens_per_second=60.0, answer_tokens=80,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def first_token_delay(self):
+        """Log-normal time to first token around the configured median"""
+        with self.lock:
+            return self.random.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def injected_failure(self):
+        """Return 429, 500 or None for the next request"""
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+def fake_answer(model, prompt, token_count):
+    """Build a deterministic answer for a prompt, one word per token"""
+    seed = int(hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    words = f"Fake {model} answer to: {' '.join(prompt.split()[:12])}".split()
+    while len(words) < token_count:
+        words.append(rng.choice(FILLER_WORDS))
+    return [word + " " for word in words[:max(token_count, 1)]]
+
+def _openai_prompt(body):
+    if not body.get("messages"):
+        return ""
+    content = body["messages"][-1].get("content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+def _gemini_prompt(body):
+    if not body.get("contents"):
+        return ""
+    return " ".join(part.get("text", "") for part in body["contents"][-1].get("parts", []))
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Answers OpenAI-style chat completions and Gemini generateContent calls"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._send_json(200, {"object": "list", "data": []})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Request body is not JSON", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        failure = config.injected_failure()
+        if failure == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error"}},
+                            {"Retry-After": str(config.retry_after)})
+            return
+        if failure == 500:
+            self._send_json(500, {"error": {"message": "Internal error (injected)", "type": "server_error"}})
+            return
+
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            self._chat_completion(body, config)
+        elif ":generateContent" in path or ":streamGenerateContent" in path:
+            model = path.rsplit("/", 1)[-1].split(":")[0]
+            self._generate_content(model, body, config, stream=":streamGenerateContent" in path)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}", "type": "not_found"}})
+
+    def _chat_completion(self, body, config):
+        model = body.get("model", "fake-model")
+        tokens = fake_answer(model, _openai_prompt(body), config.answer_tokens)
+        usage = {
+            "prompt_tokens": len(json.dumps(body)) // 4,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(json.dumps(body)) // 4 + len(tokens)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            time.sleep(config.first_token_delay() + len(tokens) / config.tokens_per_second)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        def chunk(delta, finish_reason=None, final=False):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            if final:
+                # OpenAI and Mistral read usage from the chunk, Groq from x_groq
+                event["usage"] = usage
+                event["x_groq"] = {"usage": usage}
+            return f"data: {json.dumps(event)}\n\n"
+
+        events = [chunk({"role": "assistant", "content": token}) for token in tokens]
+        events.append(chunk({"content": ""}, "stop", final=True))
+        events.append("data: [DONE]\n\n")
+        self._stream(events, config)
+
+    def _generate_content(self, model, body, config, stream):
+        tokens = fake_answer(model, _gemini_prompt(body), config.answer_tokens)
+        usage = {
+            "promptTokenCount": len(json.dumps(body)) // 4,
+            "candidatesTokenCount": len(tokens),
+            "totalTokenCount": len(json.dumps(body)) // 4 + len(tokens)
+        }
+
+        def response(text, final):
+            candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            event = {"candidates": [candidate], "modelVersion": model}
+            if final:
+                candidate["finishReason"] = "STOP"
+                event["usageMetadata"] = usage
+            return event
+
+        if not stream:
+            time.sleep(config.first_token_delay() + len(tokens) / config.tokens_per_second)
+            self._send_json(200, response("".join(tokens), final=True))
+            return
+
+        events = [f"data: {json.dumps(response(token, final=index == len(tokens) - 1))}\r\n\r\n"
+                  for index, token in enumerate(tokens)]
+        self._stream(events, config)
+
+    def _stream(self, events, config):
+        """Send server-sent events with chunked encoding, paced at the configured token rate"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(config.first_token_delay())
+        for event in events:
+            data = event.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(1 / config.tokens_per_second)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeProvider:
+    """Local stand-in for OpenAI, OpenRouter, Groq, Mistral and Gemini endpoints"""
+
+    def __init__(self, host="127.0.0.1", port=8765, config=None):
+        self.server = ThreadingHTTPServer((host, port), FakeProviderHandler)
+        self.server.daemon_threads = True
+        self.server.config = config or FakeProviderConfig()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread, for benchmarks that run in the same process"""
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-provider", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake provider APIs for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="log-normal spread of the time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="streaming rate after the first token")
+    parser.add_argument("--answer-tokens", type=int, default=80, help="tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, help="seed for latency and error injection")
+    args = parser.parse_args()
+
+    config = FakeProviderConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    provider = FakeProvider(args.host, args.port, config)
+    print(f"Fake provider listening on {provider.base_url}")
+    print(f"Point the bots at it with PROVIDER_BASE_URL={provider.base_url}")
+    try:
+        provider.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        provider.stop()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,50 +1,55 @@
 import os
 import mimetypes
-import tkinter as tk
-from tkinter import filedialog
 from pathlib import Path
-import base64
+
+class UnsupportedFileError(ValueError):
+    """Raised by an adapter that can't send a file to its model, before any request is made"""
 
 class FileHandler:
     """Helper class to handle file operations and compatibility checks"""
     
+    # Models without native PDF, DOCX or XLSX support are sent the extracted text or a digest instead
     MODEL_FILE_COMPATIBILITY = {
         "chatgpt_bot": {
-            "gpt-4.1-nano-2025-04-14": ["text", "image", "pdf", "csv", "json", "xlsx"],
-            "gpt-4.1-mini-2025-04-14": ["text", "image", "pdf", "csv", "json", "xlsx"],
-            "gpt-4o-mini-2024-07-18": ["text", "image", "pdf", "csv", "json", "xlsx"]
+            "gpt-4.1-nano-2025-04-14": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "gpt-4.1-mini-2025-04-14": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "gpt-4o-mini-2024-07-18": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"]
         },
         "deepseek_bot": {
-            "deepseek/deepseek-chat-v3-0324:free": ["text", "csv", "json"],
-            "deepseek/deepseek-r1:free": ["text", "csv", "json"],
-            "deepseek/deepseek-r1-zero:free": ["text", "csv", "json"]
+            "deepseek/deepseek-chat-v3-0324:free": ["text", "pdf", "docx", "csv", "json", "xlsx"],
+            "deepseek/deepseek-r1:free": ["text", "pdf", "docx", "csv", "json", "xlsx"],
+            "deepseek/deepseek-r1-zero:free": ["text", "pdf", "docx", "csv", "json", "xlsx"]
         },
         "gemini_bot": {
-            "gemini-2.0-flash": ["text", "image", "pdf", "csv", "json"],
-            "gemini-1.5-flash": ["text", "image", "pdf", "csv", "json"],
-            "gemini-2.5-flash-preview-04-17": ["text", "image", "pdf", "csv", "json", "xlsx"]
+            "gemini-2.0-flash": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "gemini-1.5-flash": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "gemini-2.5-flash-preview-04-17": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"]
         },
         "llama_bot": {
-            "meta-llama/llama-4-maverick-17b-128e-instruct": ["text", "csv", "json"],
-            "meta-llama/llama-4-scout-17b-16e-instruct": ["text", "csv", "json"],
-            "llama-3.3-70b-versatile": ["text", "csv", "json"]
+            "meta-llama/llama-4-maverick-17b-128e-instruct": ["text", "pdf", "docx", "csv", "json", "xlsx"],
+            "meta-llama/llama-4-scout-17b-16e-instruct": ["text", "pdf", "docx", "csv", "json", "xlsx"],
+            "llama-3.3-70b-versatile": ["text", "pdf", "docx", "csv", "json", "xlsx"]
         },
         "mistral_bot": {
-            "mistral-small-latest": ["text", "csv", "json"],
-            "pixtral-12b-2409": ["text", "image", "csv", "json"],
-            "open-mistral-nemo": ["text", "csv", "json"]
+            "mistral-small-latest": ["text", "pdf", "docx", "csv", "json", "xlsx"],
+            "pixtral-12b-2409": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "open-mistral-nemo": ["text", "pdf", "docx", "csv", "json", "xlsx"]
         },
         "qwen_bot": {
-            "qwen/qwen3-235b-a22b:free": ["text", "image", "csv", "json"],
-            "qwen/qwen3-30b-a3b:free": ["text", "image", "csv", "json"],
-            "qwen/qwen2.5-vl-72b-instruct:free": ["text", "image", "csv", "json"],
-            "qwen/qwen-2.5-coder-32b-instruct:free": ["text", "csv", "json", "code"]
+            "qwen/qwen3-235b-a22b:free": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "qwen/qwen3-30b-a3b:free": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "qwen/qwen2.5-vl-72b-instruct:free": ["text", "image", "pdf", "docx", "csv", "json", "xlsx"],
+            "qwen/qwen-2.5-coder-32b-instruct:free": ["text", "pdf", "docx", "csv", "json", "xlsx", "code"]
         }
     }
     
     @staticmethod
     def select_file():
         """Open file dialog to select a file"""
+        # tkinter is slow to import and missing on headless machines, so load it only here
+        import tkinter as tk
+        from tkinter import filedialog
+        
         root = tk.Tk()
         root.withdraw()  
         root.attributes('-topmost', True) 
@@ -56,9 +61,19 @@ class FileHandler:
         else:
             return None
     
+    # Leading bytes of common binary formats, used when the extension gives nothing away
+    MAGIC_NUMBERS = [
+        (b"\x89PNG\r\n\x1a\n", "image/png"),
+        (b"\xff\xd8\xff", "image/jpeg"),
+        (b"GIF87a", "image/gif"),
+        (b"GIF89a", "image/gif"),
+        (b"%PDF-", "application/pdf"),
+        (b"BM", "image/bmp")
+    ]
+    
     @staticmethod
-    def encode_file(file_path):
-        """Encode file to base64 and get mime type"""
+    def guess_mime_type(file_path, data=None):
+        """Guess a file's mime type from its name, falling back to its leading bytes"""
         mime_type, _ = mimetypes.guess_type(file_path)
         
         if not mime_type:
@@ -81,16 +96,43 @@ class FileHandler:
                 mime_type = f"application/{extension}+xml"
             elif extension == 'yaml' or extension == 'yml':
                 mime_type = "application/x-yaml"
+            elif data:
+                mime_type = FileHandler.sniff_mime_type(data)
             else:
                 mime_type = "application/octet-stream"
         
-        with open(file_path, "rb") as file:
-            encoded = base64.b64encode(file.read()).decode('utf-8')
+        return mime_type
+    
+    @staticmethod
+    def sniff_mime_type(data):
+        """Detect a mime type from a file's leading bytes"""
+        for magic, mime_type in FileHandler.MAGIC_NUMBERS:
+            if data.startswith(magic):
+                return mime_type
+        
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return "image/webp"
+        
+        try:
+            data[:4096].decode('utf-8')
+            return "text/plain"
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off by the 4096 byte window is still text
+            if e.reason == "unexpected end of data":
+                return "text/plain"
+            return "application/octet-stream"
+    
+    @staticmethod
+    def encode_file(file_path):
+        """Encode file to base64 and get mime type"""
+        from upload import Upload
+        
+        upload = Upload.from_path(file_path)
         
-        return {"mime_type": mime_type, "data": encoded}
+        return {"mime_type": upload.mime_type, "data": upload.base64}
     
     @staticmethod
-    def is_file_compatible(bot_module, model, filepath):
+    def is_file_compatible(bot_module, model, filepath, mime_type=None):
         """Check if a file is compatible with the given bot and model"""
         if bot_module not in FileHandler.MODEL_FILE_COMPATIBILITY:
             return False, "Bot not found in compatibility list"
@@ -98,7 +140,8 @@ class FileHandler:
         if model not in FileHandler.MODEL_FILE_COMPATIBILITY[bot_module]:
             return False, f"Model {model} not found in compatibility list"
         
-        mime_type, _ = mimetypes.guess_type(filepath)
+        if mime_type is None:
+            mime_type, _ = mimetypes.guess_type(filepath)
         file_extension = Path(filepath).suffix.lower().replace('.', '')
         
         supported_types = FileHandler.MODEL_FILE_COMPATIBILITY[bot_module][model]
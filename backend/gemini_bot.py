@@ -1,15 +1,42 @@
 import os
-from google import genai
-from google.genai import types
-import base64
-import mimetypes
-from pathlib import Path
+import io
+import time
+from transport import Transport
+from file_handler import UnsupportedFileError
+from instrumentation import payload_size, note_call
+from rate_limit import RateScheduler
+from history import HistoryStore
+from attachments import AttachmentManager
+
+# Imported lazily in initialize_bot so listing models stays fast
+SDK_MODULES = ("google.genai",)
+
+BASE_URL = "https://generativelanguage.googleapis.com"
+IMAGE_PROFILE = "gemini"
+
+# Longest wait for an uploaded file to finish processing
+FILE_PROCESSING_SECONDS = 60
+
+# Budget per API key, matching the Gemini free tier
+REQUESTS_PER_MINUTE = 15
+TOKENS_PER_MINUTE = 1000000
 
 def initialize_bot(audience, role, model=None):
     """Initialize Gemini bot with audience, role and model"""
+    from google import genai
+    from google.genai import types
+    
     API_KEY = os.getenv('GEMINI_API_KEY')
     
-    client = genai.Client(api_key=API_KEY)
+    base_url = Transport.resolve(BASE_URL)
+    
+    # Older google-genai releases cannot take an external httpx client
+    if "httpx_client" in types.HttpOptions.model_fields:
+        http_options = types.HttpOptions(base_url=base_url, httpx_client=Transport.get_client(base_url))
+    else:
+        http_options = types.HttpOptions(base_url=base_url)
+    
+    client = genai.Client(api_key=API_KEY, http_options=http_options)
     
     if audience and role:
         system_instruction = f"respond as if you're a {role} explaining things to a {audience}."
@@ -26,105 +53,151 @@ def initialize_bot(audience, role, model=None):
     return {
         "client": client,
         "model": model,   
-        "history": [],
+        "history": HistoryStore(),
         "system_instruction": system_instruction,
-        "first_message": True  
+        "first_message": True,
+        "scheduler": RateScheduler.for_key(base_url, API_KEY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
     }
 
-def ask(bot, question, file_path=None, file_prompt=None):
-    """Send a question to Gemini and get the response"""
+def _file_part(bot, upload):
+    """Refer to an image or PDF through the Files API, uploading it once per key; None means inline it instead"""
+    if not AttachmentManager.enabled():
+        return None
     
-    try:
-        if bot["first_message"]:
-            if file_path:
-                mime_type, _ = mimetypes.guess_type(file_path)
-                if mime_type and mime_type.startswith('image/'):
-                    with open(file_path, "rb") as image_file:
-                        image_data = image_file.read()
-                    
-                    prompt_text = bot['system_instruction'] + "\n\n" + (file_prompt or question)
-                    parts = [
-                        {"text": prompt_text},
-                        {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_data).decode('utf-8')}}
-                    ]
-                    
-                    response = bot["client"].models.generate_content(
-                        model=bot["model"],
-                        contents=[{"role": "user", "parts": parts}]
-                    )
-                else:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        file_content = file.read()
-                    
-                    prompt_text = f"{bot['system_instruction']}\n\n{file_prompt or question}\n\nFile content:\n{file_content}"
-                    response = bot["client"].models.generate_content(
-                        model=bot["model"],
-                        contents=[{"role": "user", "parts": [{"text": prompt_text}]}]
-                    )
+    if upload.is_image:
+        image = upload.image(IMAGE_PROFILE)
+        data, mime_type, content_key = image.data, image.mime_type, f"{upload.sha256}:{IMAGE_PROFILE}"
+    else:
+        data, mime_type, content_key = upload.data, upload.mime_type, upload.sha256
+    
+    def upload_file():
+        file, _ = bot["scheduler"].call(
+            bot["client"].files.upload,
+            0,
+            cancel=bot.get("cancel"),
+            file=io.BytesIO(data),
+            config={"mime_type": mime_type, "display_name": upload.name}
+        )
+        deadline = time.monotonic() + FILE_PROCESSING_SECONDS
+        while file.state and file.state.name == "PROCESSING" and time.monotonic() < deadline:
+            time.sleep(1)
+            file = bot["client"].files.get(name=file.name)
+        if file.state and file.state.name != "ACTIVE":
+            raise ValueError(f"File {upload.name} is {file.state.name.lower()}")
+        expires_at = file.expiration_time.timestamp() if file.expiration_time else None
+        return file.uri, file.mime_type or mime_type, expires_at
+    
+    handle = AttachmentManager.handle(bot["scheduler"].label, content_key, upload_file)
+    if handle is None:
+        return None
+    return {"file_data": {"file_uri": handle["reference"], "mime_type": handle["mime_type"]}}
+
+def _build_contents(bot, question, upload=None, file_prompt=None):
+    """Build the request contents and the user entry to keep in history"""
+    file_part = None
+    if upload and (upload.is_image or upload.mime_type == "application/pdf"):
+        file_part = _file_part(bot, upload)
+    if upload and upload.is_image and file_part is None:
+        image = upload.image(IMAGE_PROFILE)
+        file_part = {"inline_data": {"mime_type": image.mime_type, "data": image.base64}}
+    elif upload and file_part is None and upload.prompt_text is None:
+        raise UnsupportedFileError(f"This file type is not supported by {bot['model']}.")
+    
+    if bot["first_message"]:
+        if upload:
+            if file_part:
+                prompt_text = bot['system_instruction'] + "\n\n" + (file_prompt or question)
+                parts = [{"text": prompt_text}, file_part]
+                contents = [{"role": "user", "parts": parts}]
             else:
-                prompt = f"{bot['system_instruction']} Now respond to this question: {question}"
-                response = bot["client"].models.generate_content(
-                    model=bot["model"],
-                    contents=[{"role": "user", "parts": [{"text": prompt}]}]
-                )
-            
-            bot["first_message"] = False
+                prompt_text = f"{bot['system_instruction']}\n\n{file_prompt or question}\n\nFile content:\n{upload.prompt_text}"
+                contents = [{"role": "user", "parts": [{"text": prompt_text}]}]
         else:
-            messages = []
-            
-            for entry in bot["history"]:
-                messages.append(entry)
-            
-            if file_path:
-                mime_type, _ = mimetypes.guess_type(file_path)
-                if mime_type and mime_type.startswith('image/'):
-                    with open(file_path, "rb") as image_file:
-                        image_data = image_file.read()
-                    
-                    parts = [
-                        {"text": file_prompt or question},
-                        {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_data).decode('utf-8')}}
-                    ]
-                    messages.append({"role": "user", "parts": parts})
-                else:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        file_content = file.read()
-                    
-                    prompt_text = f"{file_prompt or question}\n\nFile content:\n{file_content}"
-                    messages.append({"role": "user", "parts": [{"text": prompt_text}]})
-            else:
-                messages.append({"role": "user", "parts": [{"text": question}]})
-            
-            response = bot["client"].models.generate_content(
-                model=bot["model"],
-                contents=messages
-            )
-        
-        answer = response.text
+            prompt = f"{bot['system_instruction']} Now respond to this question: {question}"
+            contents = [{"role": "user", "parts": [{"text": prompt}]}]
+    else:
+        contents = list(bot["history"])
         
-        if file_path:
-            mime_type, _ = mimetypes.guess_type(file_path)
-            if mime_type and mime_type.startswith('image/'):
-                with open(file_path, "rb") as image_file:
-                    image_data = image_file.read()
-                
-                parts = [
-                    {"text": file_prompt or question},
-                    {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_data).decode('utf-8')}}
-                ]
-                bot["history"].append({"role": "user", "parts": parts})
+        if upload:
+            if file_part:
+                parts = [{"text": file_prompt or question}, file_part]
+                contents.append({"role": "user", "parts": parts})
             else:
-                bot["history"].append({"role": "user", "parts": [{"text": f"[File uploaded] {file_prompt or question}"}]})
+                prompt_text = f"{file_prompt or question}\n\nFile content:\n{upload.prompt_text}"
+                contents.append({"role": "user", "parts": [{"text": prompt_text}]})
+        else:
+            contents.append({"role": "user", "parts": [{"text": question}]})
+    
+    if upload:
+        if file_part:
+            # A file handle stays in the history, so later turns can still refer to the file
+            user_entry = {"role": "user", "parts": [{"text": file_prompt or question}, file_part]}
         else:
-            bot["history"].append({"role": "user", "parts": [{"text": question}]})
+            user_entry = {"role": "user", "parts": [{"text": f"[File uploaded] {file_prompt or question}"}]}
+    else:
+        user_entry = {"role": "user", "parts": [{"text": question}]}
+    
+    return contents, user_entry
+
+def _record_turn(bot, user_entry, answer):
+    """Append a completed exchange to the bot's history"""
+    bot["first_message"] = False
+    bot["history"].append(user_entry)
+    bot["history"].append({"role": "model", "parts": [{"text": answer}]})
+
+def ask(bot, question, upload=None, file_prompt=None):
+    """Send a question to Gemini and get the response"""
+    
+    try:
+        contents, user_entry = _build_contents(bot, question, upload, file_prompt)
+        request_bytes = payload_size(contents)
+        
+        response, retries = bot["scheduler"].call(
+            bot["client"].models.generate_content,
+            request_bytes // 4,
+            cancel=bot.get("cancel"),
+            model=bot["model"],
+            contents=contents
+        )
         
-        bot["history"].append({"role": "model", "parts": [{"text": answer}]})
+        answer = response.text
+        _record_turn(bot, user_entry, answer)
+        note_call(bot, request_bytes, answer, response.usage_metadata, retries)
         
         return answer
         
+    except UnsupportedFileError:
+        raise
     except Exception as e:
         return f"Error: {str(e)}"
 
+def ask_stream(bot, question, upload=None, file_prompt=None):
+    """Send a question to Gemini and yield the response as it is generated, raising if the call fails"""
+    
+    contents, user_entry = _build_contents(bot, question, upload, file_prompt)
+    request_bytes = payload_size(contents)
+    
+    stream, retries = bot["scheduler"].call_stream(
+        bot["client"].models.generate_content_stream,
+        request_bytes // 4,
+        cancel=bot.get("cancel"),
+        model=bot["model"],
+        contents=contents
+    )
+    
+    deltas = []
+    usage = None
+    with stream:
+        for chunk in stream:
+            if chunk.text:
+                deltas.append(chunk.text)
+                yield chunk.text
+            if chunk.usage_metadata:
+                usage = chunk.usage_metadata
+    
+    _record_turn(bot, user_entry, "".join(deltas))
+    note_call(bot, request_bytes, "".join(deltas), usage, retries)
+
 def get_available_models():
     """Return available models for Gemini"""
     return {
@@ -0,0 +1,153 @@
+import sys
+import json
+import hashlib
+import threading
+
+def _deep_size(value):
+    """Bytes held by a JSON-like value and everything inside it"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(key) + _deep_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+class Turn(dict):
+    """A history entry as a plain message dict, which every SDK accepts, that caches its own JSON encoding
+
+    SDK message objects are reduced to their role and content when they
+    enter a history, and system messages with the same prompt are one
+    shared Turn across every bot. The SDKs still serialize each request
+    themselves; the cached encoding is what payload measurement and the
+    response cache's fingerprints use, so neither re-encodes the whole
+    history every turn.
+    """
+
+    __slots__ = ("_encoded", "_digest")
+
+    _system_turns = {}
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encoded = None
+        self._digest = None
+
+    @classmethod
+    def of(cls, message):
+        """Return message as a Turn, converting dicts and SDK message objects"""
+        if isinstance(message, Turn):
+            return message
+        if isinstance(message, dict):
+            if message.get("role") == "system" and isinstance(message.get("content"), str) and len(message) == 2:
+                return cls.system(message["content"])
+            return cls(message)
+        return cls(role=getattr(message, "role", None), content=getattr(message, "content", None))
+
+    @classmethod
+    def system(cls, content):
+        """The shared Turn for a system prompt"""
+        content = sys.intern(content)
+        with cls._lock:
+            turn = cls._system_turns.get(content)
+            if turn is None:
+                turn = cls(role="system", content=content)
+                cls._system_turns[content] = turn
+            return turn
+
+    # Changing a turn in place drops its cached encoding
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._encoded = self._digest = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._encoded = self._digest = None
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._encoded = self._digest = None
+
+    @property
+    def encoded(self):
+        """The turn's JSON in UTF-8, as it would appear in a request body"""
+        if self._encoded is None:
+            self._encoded = json.dumps(self, default=str).encode("utf-8")
+        return self._encoded
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.encoded).digest()
+        return self._digest
+
+    def memory_bytes(self):
+        size = sys.getsizeof(self) + sum(_deep_size(key) + _deep_size(value) for key, value in self.items())
+        if self._encoded is not None:
+            size += sys.getsizeof(self._encoded)
+        return size
+
+class HistoryStore(list):
+    """A bot's conversation history, kept as Turns so each message is measured and hashed only once
+
+    It is still a list, so adapters append to it and pass it to their SDK
+    as before; whatever goes in is converted to a Turn on the way.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, messages=()):
+        super().__init__(Turn.of(message) for message in messages)
+
+    def append(self, message):
+        super().append(Turn.of(message))
+
+    def extend(self, messages):
+        super().extend(Turn.of(message) for message in messages)
+
+    def insert(self, index, message):
+        super().insert(index, Turn.of(message))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [Turn.of(message) for message in value]
+        else:
+            value = Turn.of(value)
+        super().__setitem__(index, value)
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def copy(self):
+        """A new store sharing this one's turns"""
+        return HistoryStore(self)
+
+    @staticmethod
+    def size_of(messages):
+        """Bytes json.dumps would produce for a list of messages, reusing each Turn's encoding"""
+        size = 2 + 2 * max(len(messages) - 1, 0)
+        for message in messages:
+            if isinstance(message, Turn):
+                size += len(message.encoded)
+            else:
+                size += len(json.dumps(message, default=str).encode("utf-8"))
+        return size
+
+    @staticmethod
+    def fingerprint(messages):
+        """A hash of a list of messages, built from each Turn's cached digest"""
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(Turn.of(message).digest)
+        return digest.hexdigest()
+
+    def memory_bytes(self, seen=None):
+        """Bytes held by this history; turns already in `seen` (shared system prompts) are not counted again"""
+        seen = set() if seen is None else seen
+        size = sys.getsizeof(self)
+        for turn in self:
+            if id(turn) not in seen:
+                seen.add(id(turn))
+                size += turn.memory_bytes()
+        return size
\ No newline at end of file
@@ -0,0 +1,127 @@
+import io
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import cached_property
+
+from PIL import Image, ImageOps
+
+# How each provider wants images: the size it downsamples to anyway and the encoding to send
+IMAGE_PROFILES = {
+    # Fit within 2048x2048, then scale the short side to 768 (OpenAI's high detail tiling)
+    "openai": {"max_side": 2048, "short_side": 768, "format": "JPEG", "quality": 85},
+    # Gemini tiles large images into 768px crops, little is gained beyond 3072
+    "gemini": {"max_side": 3072, "format": "JPEG", "quality": 85},
+    "mistral": {"max_side": 1540, "format": "JPEG", "quality": 85},
+    # Qwen-VL's default pixel budget is 1280 patches of 28x28
+    "qwen": {"max_pixels": 1280 * 28 * 28, "format": "WEBP", "quality": 85},
+}
+# Images this small in bytes and already the right size are sent as they are
+KEEP_ORIGINAL_BYTES = 256 * 1024
+SENDABLE_MIME_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+class PreparedImage:
+    """Image bytes ready to send, with the encodings the adapters need"""
+
+    def __init__(self, data, mime_type, width=None, height=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = len(data)
+        self.width = width
+        self.height = height
+
+    @cached_property
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @cached_property
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+class ImageProcessor:
+    """Resize and re-encode uploaded images once per provider profile, shared by every bot"""
+
+    MAX_CACHED = 16
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def prepare(cls, upload, profile):
+        """Return the PreparedImage of an upload for a profile, computing it at most once"""
+        key = (upload.sha256, profile)
+        with cls._lock:
+            future = cls._cache.get(key)
+            if future is None:
+                future = Future()
+                cls._cache[key] = future
+                if len(cls._cache) > cls.MAX_CACHED:
+                    cls._cache.popitem(last=False)
+                owner = True
+            else:
+                cls._cache.move_to_end(key)
+                owner = False
+
+        if owner:
+            try:
+                future.set_result(cls._convert(upload, IMAGE_PROFILES.get(profile)))
+            except Exception:
+                # A file Pillow can't read is still sent as it was uploaded
+                future.set_result(PreparedImage(upload.data, upload.mime_type))
+        return future.result()
+
+    @staticmethod
+    def target_size(width, height, settings):
+        """The dimensions an image should be scaled to under a profile, never enlarging it"""
+        scale = 1.0
+        if settings.get("max_side"):
+            scale = min(scale, settings["max_side"] / max(width, height))
+        if settings.get("short_side"):
+            scale = min(scale, settings["short_side"] / min(width, height))
+        if settings.get("max_pixels"):
+            scale = min(scale, (settings["max_pixels"] / (width * height)) ** 0.5)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    @staticmethod
+    def _convert(upload, settings):
+        if settings is None:
+            return PreparedImage(upload.data, upload.mime_type)
+
+        with Image.open(io.BytesIO(upload.data)) as image:
+            # Animated images would lose their frames
+            if getattr(image, "is_animated", False):
+                return PreparedImage(upload.data, upload.mime_type, *image.size)
+
+            original = image.size
+            size = ImageProcessor.target_size(*original, settings)
+            if (size == original and upload.size <= KEEP_ORIGINAL_BYTES
+                    and upload.mime_type in SENDABLE_MIME_TYPES):
+                return PreparedImage(upload.data, upload.mime_type, *image.size)
+
+            image = ImageOps.exif_transpose(image)
+            oriented = image.size
+            if oriented != original:
+                # Rotated by its EXIF orientation
+                size = size[::-1]
+            if size != image.size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+
+            image_format = settings["format"]
+            if image_format == "JPEG" and image.mode in ("RGBA", "LA", "P"):
+                # JPEG has no alpha channel, so transparent areas become white
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGB")
+
+            output = io.BytesIO()
+            image.save(output, image_format, quality=settings["quality"], optimize=True)
+            data = output.getvalue()
+
+        # Re-encoding a small image can make it bigger, in which case the original goes
+        if size == oriented and len(data) >= upload.size and upload.mime_type in SENDABLE_MIME_TYPES:
+            return PreparedImage(upload.data, upload.mime_type, *size)
+        return PreparedImage(data, f"image/{image_format.lower()}", *size)
\ No newline at end of file
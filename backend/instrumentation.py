@@ -0,0 +1,215 @@
+import os
+import json
+import math
+import threading
+from collections import deque
+from history import HistoryStore
+
+def payload_size(payload):
+    """Approximate the bytes a request body takes on the wire"""
+    if isinstance(payload, list):
+        # Turns already in a history are measured from their cached encoding
+        return HistoryStore.size_of(payload)
+    return len(json.dumps(payload, default=str).encode("utf-8"))
+
+def note_call(bot, request_bytes, answer, usage=None, retries=0):
+    """Remember the sizes, token counts and retries of an adapter's last provider call
+
+    `usage` is the SDK's usage object: OpenAI, Groq and Mistral report
+    prompt/completion tokens, Gemini reports prompt/candidates token counts.
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or getattr(usage, "prompt_token_count", None)
+    completion_tokens = getattr(usage, "completion_tokens", None) or getattr(usage, "candidates_token_count", None)
+
+    bot["last_call"] = {
+        "model": bot["model"],
+        "request_bytes": request_bytes,
+        "response_bytes": len(answer.encode("utf-8")) if answer else 0,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "retries": retries
+    }
+
+    # The request side was charged up front, the completion is only known now
+    if bot.get("scheduler"):
+        bot["scheduler"].settle(completion_tokens)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+class Metrics:
+    """Per-call latency, token and size measurements, summarised per bot and model
+
+    Calls are kept per (bot, model). With a `window`, only that many recent
+    calls are kept for each, so a long-running process such as the HTTP
+    server holds a bounded amount and its figures describe recent calls.
+    Running totals since start are kept alongside for the Prometheus
+    counters, which must never go down.
+    """
+
+    TOTAL_KEYS = ("calls", "errors", "cached", "retries", "latency_sum", "ttft_sum", "ttft_count",
+                  "prompt_tokens", "completion_tokens", "request_bytes", "response_bytes")
+
+    def __init__(self, prom_path=None, window=None):
+        self.prom_path = prom_path or os.getenv("METRICS_PROM_PATH", "metrics.prom")
+        self.window = window
+        self.calls = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, bot_name, result):
+        """Store one dispatch result enriched with the adapter's call details"""
+        if result["status"] in ("incompatible", "skipped", "cancelled"):
+            return
+
+        call = {
+            "bot": bot_name,
+            "model": result.get("model") or "unknown",
+            "latency": result.get("latency", 0.0),
+            "ttft": result.get("ttft", result.get("latency", 0.0)),
+            "request_bytes": result.get("request_bytes") or 0,
+            "response_bytes": result.get("response_bytes") or 0,
+            "prompt_tokens": result.get("prompt_tokens") or 0,
+            "completion_tokens": result.get("completion_tokens") or 0,
+            "retries": result.get("retries") or 0,
+            "cached": bool(result.get("cached")),
+            "hedged": bool(result.get("hedged")),
+            "chunks": result.get("chunks") or 0,
+            "error": result["status"] != "answer" or result["text"].startswith("Error")
+        }
+        with self.lock:
+            group = self.calls.get((bot_name, call["model"]))
+            if group is None:
+                group = self.calls[(bot_name, call["model"])] = deque(maxlen=self.window)
+            group.append(call)
+
+            totals = self.totals.get((bot_name, call["model"]))
+            if totals is None:
+                totals = self.totals[(bot_name, call["model"])] = dict.fromkeys(self.TOTAL_KEYS, 0)
+            totals["calls"] += 1
+            totals["errors"] += call["error"]
+            totals["cached"] += call["cached"]
+            totals["latency_sum"] += call["latency"]
+            if call["ttft"] is not None:
+                totals["ttft_sum"] += call["ttft"]
+                totals["ttft_count"] += 1
+            for key in ("retries", "prompt_tokens", "completion_tokens", "request_bytes", "response_bytes"):
+                totals[key] += call[key]
+
+    def summary(self):
+        """Aggregate the recorded calls per (bot, model)"""
+        with self.lock:
+            groups = {key: list(group) for key, group in self.calls.items()}
+
+        summary = {}
+        for key, group in groups.items():
+            latencies = [call["latency"] for call in group]
+            ttfts = [call["ttft"] for call in group if call["ttft"] is not None]
+            completion_tokens = sum(call["completion_tokens"] for call in group)
+            total_latency = sum(latencies)
+            summary[key] = {
+                "calls": len(group),
+                "errors": sum(call["error"] for call in group),
+                "cached": sum(call["cached"] for call in group),
+                "retries": sum(call["retries"] for call in group),
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p95": percentile(latencies, 0.95),
+                "latency_sum": total_latency,
+                "ttft_p50": percentile(ttfts, 0.5),
+                "ttft_p95": percentile(ttfts, 0.95),
+                "ttft_sum": sum(ttfts),
+                "ttft_count": len(ttfts),
+                "prompt_tokens": sum(call["prompt_tokens"] for call in group),
+                "completion_tokens": completion_tokens,
+                "tokens_per_second": completion_tokens / total_latency if total_latency else 0.0,
+                "request_bytes": sum(call["request_bytes"] for call in group),
+                "response_bytes": sum(call["response_bytes"] for call in group)
+            }
+        return summary
+
+    def running_totals(self):
+        """Counts and sums per (bot, model) over every call since start, however small the window"""
+        with self.lock:
+            return {key: dict(totals) for key, totals in self.totals.items()}
+
+    def ttft_samples(self, bot_name, model):
+        with self.lock:
+            return [call["ttft"] for call in self.calls.get((bot_name, model), ())
+                    if not call["error"] and not call["cached"] and not call["hedged"] and not call["chunks"]]
+
+    def format_table(self):
+        """Render the summary as a plain text table for the terminal"""
+        summary = self.summary()
+        if not summary:
+            return "No calls recorded yet."
+
+        lines = [f"{'Bot':<10} {'Model':<40} {'Calls':>5} {'Err':>4} {'p50 s':>7} {'p95 s':>7} "
+                 f"{'TTFT p50':>8} {'TTFT p95':>8} {'Tok in':>7} {'Tok out':>7} {'Tok/s':>6}"]
+        for (bot_name, model), stats in sorted(summary.items()):
+            lines.append(
+                f"{bot_name:<10} {model[:40]:<40} {stats['calls']:>5} {stats['errors']:>4} "
+                f"{stats['latency_p50']:>7.2f} {stats['latency_p95']:>7.2f} "
+                f"{stats['ttft_p50'] or 0:>8.2f} {stats['ttft_p95'] or 0:>8.2f} "
+                f"{stats['prompt_tokens']:>7} {stats['completion_tokens']:>7} {stats['tokens_per_second']:>6.1f}"
+            )
+        return "\n".join(lines)
+
+    def write_prometheus(self, path=None, extra_lines=()):
+        """Write the summary in Prometheus text exposition format, atomically
+
+        Quantiles describe the recent window; counters and the summaries'
+        _sum and _count come from the running totals, so they only increase.
+        """
+        path = path or self.prom_path
+        summary = self.summary()
+        totals = self.running_totals()
+        labelled = [({"bot": bot_name, "model": model}, {**stats, **totals[(bot_name, model)]})
+                    for (bot_name, model), stats in sorted(summary.items())]
+        lines = []
+
+        for name, prefix, help_text in [
+            ("synapsify_call_latency_seconds", "latency", "Wall time of each provider call"),
+            ("synapsify_time_to_first_token_seconds", "ttft", "Time until the first answer token arrived")
+        ]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} summary")
+            for labels, stats in labelled:
+                for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                    if stats[f"{prefix}_{key}"] is not None:
+                        lines.append(f"{name}{_labels({**labels, 'quantile': quantile})} {stats[f'{prefix}_{key}']}")
+                count = stats["calls"] if prefix == "latency" else stats["ttft_count"]
+                lines.append(f"{name}_sum{_labels(labels)} {stats[prefix + '_sum']}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        counters = [
+            ("synapsify_tokens_total", "Prompt and completion tokens reported by the provider",
+             [({**labels, "kind": kind}, stats[f"{kind}_tokens"]) for labels, stats in labelled for kind in ("prompt", "completion")]),
+            ("synapsify_bytes_total", "Request and response payload bytes",
+             [({**labels, "direction": direction}, stats[f"{direction}_bytes"]) for labels, stats in labelled for direction in ("request", "response")]),
+            ("synapsify_errors_total", "Calls that ended in an error", [(labels, stats["errors"]) for labels, stats in labelled]),
+            ("synapsify_retries_total", "Provider call retries", [(labels, stats["retries"]) for labels, stats in labelled]),
+            ("synapsify_cache_hits_total", "Calls answered from the response cache", [(labels, stats["cached"]) for labels, stats in labelled])
+        ]
+        for name, help_text, samples in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        lines.extend(extra_lines)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import datetime
+import threading
+
+class ConversationJournal:
+    """Append-only JSONL record of a chat session, written event by event
+
+    Writes are buffered and fsynced at most every `fsync_interval` seconds, so a
+    crash loses at most a few seconds of conversation. The plain text transcript
+    used by '/download' is rendered from the journal on demand.
+    """
+
+    def __init__(self, path=None, fsync_interval=5.0):
+        if path is None:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(os.getenv("JOURNAL_DIR", "journals"), f"conversation_{timestamp}.jsonl")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.events = 0
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", buffering=64 * 1024)
+        self.last_sync = time.monotonic()
+
+    def record(self, event_type, **fields):
+        """Append one event with a timestamp"""
+        record = {"type": event_type, "ts": datetime.datetime.now().isoformat(timespec="milliseconds"), **fields}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self.lock:
+            self.file.write(line)
+            self.events += 1
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def record_question(self, question, upload=None):
+        """Start a new turn"""
+        self.turn += 1
+        self.record("question", turn=self.turn, text=question, file=upload.name if upload else None)
+
+    def record_result(self, bot_name, position, result):
+        """Record one bot's dispatch result for the current turn"""
+        fields = {
+            "turn": self.turn,
+            "bot": bot_name,
+            "position": position,
+            "text": result["text"],
+            "latency": round(result.get("latency", 0.0), 4),
+        }
+        if result.get("ttft") is not None:
+            fields["ttft"] = round(result["ttft"], 4)
+        if result.get("model"):
+            fields["model"] = result["model"]
+        if result.get("hedged"):
+            fields["hedged"] = True
+
+        if result["status"] == "answer":
+            self.record("answer", **fields)
+        else:
+            self.record("error", kind=result["status"], **fields)
+
+    def record_summary(self, summary):
+        self.record("summary", turn=self.turn, text=summary)
+
+    def flush(self):
+        """Hand buffered events to the OS so they survive a crash of this process"""
+        with self.lock:
+            self.file.flush()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+    def read(self):
+        """Return every event recorded so far"""
+        self.flush()
+        with open(self.path, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def render_text(self):
+        """Render the journal in the plain text transcript format"""
+        parts = []
+        results = []
+
+        def flush_results():
+            # Bots answer in any order, the transcript lists them in a fixed one
+            for event in sorted(results, key=lambda event: event["position"]):
+                if event["type"] == "answer" and event.get("hedged"):
+                    parts.append(f"\n{event['bot']} ({event['model']}): {event['text']}\n")
+                    parts.append("-" * 50 + "\n")
+                elif event["type"] == "answer":
+                    parts.append(f"\n{event['bot']}: {event['text']}\n")
+                    parts.append("-" * 50 + "\n")
+                elif event.get("kind") in ("incompatible", "skipped", "cancelled"):
+                    parts.append(f"\n{event['bot']}: {event['text']}\n")
+                else:
+                    parts.append(f"\n{event['bot']} error: {event['text']}\n")
+                    parts.append("-" * 50 + "\n")
+            results.clear()
+
+        for event in self.read():
+            if event["type"] in ("answer", "error"):
+                results.append(event)
+                continue
+
+            flush_results()
+            if event["type"] == "question":
+                parts.append(f"\nYou: {event['text']}\n")
+                if event.get("file"):
+                    parts.append(f"[File uploaded: {event['file']}]\n")
+            elif event["type"] == "summary":
+                parts.append("\n\n" + "=" * 50 + "\nSUMMARY:\n" + event["text"] + "\n" + "=" * 50)
+
+        flush_results()
+        return "".join(parts)
\ No newline at end of file
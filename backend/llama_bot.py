@@ -1,11 +1,33 @@
 import os
-from groq import Groq
+from transport import Transport
+from file_handler import UnsupportedFileError
+from instrumentation import payload_size, note_call
+from rate_limit import RateScheduler
+from history import HistoryStore
+
+# Imported lazily in initialize_bot so listing models stays fast
+SDK_MODULES = ("groq",)
+
+BASE_URL = "https://api.groq.com"
+
+# Budget per API key, matching the Groq free tier
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 6000
 
 def initialize_bot(audience, role, model=None):
     """Initialize Llama bot with audience, role and model"""
+    from groq import Groq
+    
     API_KEY = os.getenv('LLAMA_API_KEY')
     
-    client = Groq(api_key=API_KEY)
+    base_url = Transport.resolve(BASE_URL)
+    
+    client = Groq(
+        base_url=base_url,
+        api_key=API_KEY,
+        max_retries=0,
+        http_client=Transport.get_client(base_url)
+    )
     
     system_content = ""
     if audience and role:
@@ -27,25 +49,21 @@ def initialize_bot(audience, role, model=None):
     
     return {
         "client": client,
-        "history": [system_msg],
-        "model": model
+        "history": HistoryStore([system_msg]),
+        "model": model,
+        "scheduler": RateScheduler.for_key(base_url, API_KEY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
     }
 
-def ask(bot, question, file_path=None, file_prompt=None):
-    """Send a question to Llama and get the response"""
-    if file_path:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                file_content = file.read()
-            
-            if file_prompt:
-                full_question = f"{file_prompt}\n\nFile content:\n{file_content}"
-            else:
-                full_question = f"{question}\n\nFile content:\n{file_content}"
-        except UnicodeDecodeError:
-            return "Error: This model only supports text files."
-        except Exception as e:
-            return f"Error processing file: {str(e)}"
+def _build_question_msg(bot, question, upload=None, file_prompt=None):
+    """Build the user message for a question, returning (message, error)"""
+    if upload:
+        if upload.prompt_text is None:
+            return None, "This model only supports text files."
+        
+        if file_prompt:
+            full_question = f"{file_prompt}\n\nFile content:\n{upload.prompt_text}"
+        else:
+            full_question = f"{question}\n\nFile content:\n{upload.prompt_text}"
     else:
         full_question = question
     
@@ -54,21 +72,66 @@ def ask(bot, question, file_path=None, file_prompt=None):
         "content": full_question
     }
     
+    return question_msg, None
+
+def ask(bot, question, upload=None, file_prompt=None):
+    """Send a question to Llama and get the response"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
     bot["history"].append(question_msg)
     
     try:
-        response = bot["client"].chat.completions.create(
+        request_bytes = payload_size(bot["history"])
+        response, retries = bot["scheduler"].call(
+            bot["client"].chat.completions.create,
+            request_bytes // 4,
+            cancel=bot.get("cancel"),
             messages=bot["history"],
             model=bot["model"]
         )
         
         answer_msg = response.choices[0].message
         bot["history"].append(answer_msg)
+        note_call(bot, request_bytes, answer_msg.content, response.usage, retries)
         
         return answer_msg.content
     except Exception as e:
         return f"Error: {str(e)}"
 
+def ask_stream(bot, question, upload=None, file_prompt=None):
+    """Send a question to Llama and yield the response as it is generated, raising if the call fails"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
+    bot["history"].append(question_msg)
+    
+    request_bytes = payload_size(bot["history"])
+    stream, retries = bot["scheduler"].call_stream(
+        bot["client"].chat.completions.create,
+        request_bytes // 4,
+        cancel=bot.get("cancel"),
+        messages=bot["history"],
+        model=bot["model"],
+        stream=True
+    )
+    
+    deltas = []
+    usage = None
+    with stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                deltas.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+            # Groq reports streaming usage on the final chunk's x_groq field
+            if chunk.x_groq and chunk.x_groq.usage:
+                usage = chunk.x_groq.usage
+    
+    bot["history"].append({"role": "assistant", "content": "".join(deltas)})
+    note_call(bot, request_bytes, "".join(deltas), usage, retries)
+
 def get_available_models():
     """Return available models for Llama"""
     return {
@@ -1,8 +1,20 @@
 import os
 from dotenv import load_dotenv
-import importlib
+import argparse
 from file_handler import FileHandler
 from summarizer import Summarizer
+from upload import Upload
+from extraction import DocumentExtractor
+from context_window import ContextWindow
+from response_cache import ResponseCache
+from journal import ConversationJournal
+from transport import Transport
+from rate_limit import RateScheduler
+from registry import ProviderRegistry
+from instrumentation import Metrics
+from dispatcher import Dispatcher
+from circuit_breaker import CircuitBreaker
+from stream_view import StreamView
 import datetime
 
 load_dotenv()
@@ -55,7 +67,7 @@ def select_bots():
 def select_model(bot_name, module_name):
     """Allow user to select a model for the bot"""
     try:
-        bot_module = importlib.import_module(module_name)
+        bot_module = ProviderRegistry.load(module_name)
         available_models = bot_module.get_available_models()
         
         print(f"\nAvailable models for {bot_name}:")
@@ -93,13 +105,13 @@ def configure_bots(selected_bots):
     
     return selected_bots
 
-def initialize_bots(selected_bots):
+def initialize_bots(selected_bots, cache):
     """Initialize each bot module and create chat instances"""
     initialized_bots = {}
     
     for bot_name, config in selected_bots.items():
         try:
-            bot_module = importlib.import_module(config["module"])
+            bot_module = ProviderRegistry.load_sdk(config["module"])
             
             bot_instance = bot_module.initialize_bot(
                 config["audience"], 
@@ -109,10 +121,17 @@ def initialize_bots(selected_bots):
             
             initialized_bots[bot_name] = {
                 "instance": bot_instance,
-                "ask_function": bot_module.ask,
-                "module_name": config["module"]
+                "ask_function": cache.wrap(config["module"], bot_module.ask),
+                "stream_function": cache.wrap_stream(config["module"], bot_module.ask_stream) if hasattr(bot_module, "ask_stream") else None,
+                "module_name": config["module"],
+                "context": ContextWindow(bot_instance["model"])
             }
             
+            # e.g. BOT_DEADLINE_GEMINI=30 overrides BOT_DEADLINE_SECONDS for one bot
+            deadline = os.getenv(f"BOT_DEADLINE_{bot_name.upper()}")
+            if deadline:
+                initialized_bots[bot_name]["deadline"] = float(deadline)
+            
             print(f"Successfully initialized {bot_name}")
             
         except Exception as e:
@@ -121,21 +140,33 @@ def initialize_bots(selected_bots):
     return initialized_bots
 
 def upload_file():
-    """Open file dialog for user to select a file using tkinter"""
+    """Open file dialog for user to select a file and read it once for all bots"""
     file_path = FileHandler.select_file()
     
     if file_path:
-        file_name = os.path.basename(file_path)
-        print(f"File selected: {file_name}")
+        try:
+            upload = Upload.from_path(file_path)
+            # Documents are parsed while the file prompt is being typed
+            DocumentExtractor.prefetch(upload)
+        except OSError as e:
+            print(f"Error reading file: {str(e)}")
+            return None, None
+        
+        print(f"File selected: {upload.name}")
         print("Enter a specific prompt for this file (or press Enter to use the regular question):")
         file_prompt = input("> ").strip()
-        return file_path, file_prompt if file_prompt else None
+        if upload.is_structured:
+            print("The bots get a summary of the data's columns, statistics and sample rows. Send the full data instead? (y/N)")
+            if input("> ").strip().lower() in ("y", "yes"):
+                upload = upload.with_full_data()
+        return upload, file_prompt if file_prompt else None
     else:
         print("No file selected.")
         return None, None
 
-def save_conversation(conversation_log):
-    """Save the conversation log to a text file"""
+def save_conversation(journal):
+    """Save the conversation journal to a text file"""
+    conversation_log = journal.render_text() if journal.events else ""
     if not conversation_log:
         print("No conversation to save.")
         return False
@@ -154,7 +185,102 @@ def save_conversation(conversation_log):
         print(f"\nError saving conversation: {str(e)}")
         return False
 
-def chat_interface(bots):
+def print_result(bot_name, result):
+    """Print a single bot's result as soon as it arrives"""
+    if result["status"] in ("incompatible", "skipped", "cancelled"):
+        print(f"\n{bot_name}: {result['text']}")
+    elif result["status"] == "answer" and result.get("hedged"):
+        print(f"\n{bot_name} (answered by backup model {result['model']}): {result['text']}\n")
+    elif result["status"] == "answer":
+        print(f"\n{bot_name}: {result['text']}\n")
+    else:
+        print(f"\n{bot_name} error: {result['text']}\n")
+    print("-" * 50)
+
+def print_bot_status(bots):
+    """One line with each bot's provider circuit state"""
+    states = [f"{bot_name} {CircuitBreaker.for_provider(bot_data['module_name']).describe()}"
+              for bot_name, bot_data in bots.items()]
+    print("Bots: " + " | ".join(states))
+
+def handle_cache_command(cache, command):
+    """Switch the response cache on or off, clear it, or show its counters"""
+    action = command[len('/cache'):].strip()
+    
+    if action == 'on':
+        cache.enabled = True
+    elif action == 'off':
+        cache.enabled = False
+    elif action == 'clear':
+        cache.clear()
+        print("\nResponse cache cleared.")
+    
+    stats = cache.stats()
+    print(f"\nResponse cache {'on' if stats['enabled'] else 'off'}: "
+          f"{stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+def handle_hedge_command(bots, command):
+    """Switch hedging on or off for one bot, or show which bots hedge"""
+    name = command[len('/hedge'):].strip().lower()
+    
+    if name:
+        matches = [bot_name for bot_name in bots if bot_name.lower() == name]
+        if not matches:
+            print(f"\nNo bot called '{name}'.")
+            return
+        bots[matches[0]]["hedge"] = not bots[matches[0]].get("hedge")
+    
+    hedging = [bot_name for bot_name, bot_data in bots.items() if bot_data.get("hedge")]
+    print(f"\nHedging: {', '.join(hedging) if hedging else 'off for all bots'}")
+
+def parse_race_command(command, bot_count, race):
+    """Read '/race N' or '/race off' and return the new number of answers to wait for"""
+    argument = command[len('/race'):].strip()
+    
+    if argument in ('off', '0'):
+        race = None
+    elif argument.isdigit() and 0 < int(argument) < bot_count:
+        race = int(argument)
+    elif argument:
+        print(f"\nUse '/race N' with N between 1 and {bot_count - 1}, or '/race off'.")
+        return race
+    
+    if race:
+        print(f"\nRace mode: keeping the first {race} answer{'s' if race > 1 else ''}, the other bots are cancelled.")
+    else:
+        print("\nRace mode off: waiting for every bot.")
+    return race
+
+def print_pool_stats():
+    """Show the shared HTTP connection pools and per-key rate limit queues"""
+    stats = Transport.pool_stats()
+    if not stats:
+        print("\nNo connection pools open yet.")
+        return
+    
+    print()
+    for base_url, pool in stats.items():
+        print(f"{base_url}: {pool['requests']} requests, {pool['connections']} connections "
+              f"({pool['idle']} idle), HTTP/2 {'on' if pool['http2'] else 'off'}")
+    
+    for label, scheduler in RateScheduler.stats().items():
+        print(f"{label}: {scheduler['queued']} queued, {scheduler['in_flight']} in flight, "
+              f"{scheduler['retries']} retries, {scheduler['rate_limited']} rate limited, "
+              f"{scheduler['waited']:.1f}s waited for budget")
+
+def print_history_memory(bots):
+    """Show how many messages and how much memory each bot's history holds"""
+    seen = set()  # System prompts are shared between bots, so each is counted once
+    total = 0
+    print()
+    for bot_name, bot_data in bots.items():
+        history = bot_data["instance"]["history"]
+        size = history.memory_bytes(seen)
+        total += size
+        print(f"{bot_name}: {len(history)} messages, {size / 1024:.1f} KB")
+    print(f"All histories: {total / 1024:.1f} KB")
+
+def chat_interface(bots, cache):
     """Run the chat interface for comparing bot responses"""
     bot_names = list(bots.keys())
     
@@ -165,108 +291,165 @@ def chat_interface(bots):
     print(f"\nChat with {', '.join(bot_names)}. Type 'exit' to quit.")
     print("You can upload files by typing '/upload' as your question.")
     print("You can get a summary of all responses by typing '/summarize' after seeing all responses.")
+    print("Type '/summarize polish' to have Gemini rewrite the summary.")
     print("To save the conversation, type '/download'.")
+    print("Type '/stream' to switch live token streaming on or off.")
+    print("Type '/cache on', '/cache off', '/cache clear' or '/cache' to manage the response cache.")
+    print("Type '/pool' to see the shared connection pools and rate limit queues.")
+    print("Type '/stats' to see latency and token statistics per bot and model.")
+    print("Type '/memory' to see how much memory each bot's history takes.")
+    print("Type '/hedge <bot>' to send a slow bot's question to a backup model as well.")
+    print("Type '/race N' to keep only the first N answers and cancel the rest, '/race off' to wait for all.")
     
     current_responses = {}  # Store the latest responses from each bot
-    conversation_log = ""   # Store the entire conversation
+    journal = ConversationJournal()  # Record the entire conversation as it happens
+    metrics = Metrics()
+    # Room for one abandoned call per bot, since a timed-out call keeps its thread until the provider gives up
+    dispatcher = Dispatcher(max_workers=len(bot_names) * 2, metrics=metrics)
+    streaming = True
+    race = None  # Stop after this many answers, None to wait for every bot
+    polish = False  # Whether the last /summarize asked for a Gemini rewrite, prefetched from then on
+    prefetch = os.getenv("SUMMARY_PREFETCH", "on").lower() != "off"
     
     while True:
         question = input("\nYou: ")
         
         if question.strip().lower() in ['exit', 'quit']:
-            if conversation_log:
+            if journal.events:
                 print("\nDo you want to save the conversation before exiting? (y/n)")
                 save_choice = input("> ").strip().lower()
                 if save_choice == 'y':
-                    save_conversation(conversation_log)
+                    save_conversation(journal)
             print("Exiting chat. Goodbye!")
+            journal.close()
+            dispatcher.shutdown()
+            Summarizer.shutdown()
+            DocumentExtractor.shutdown()
+            Transport.close_all()
             break
             
         if question.strip().lower() == '/download':
-            save_conversation(conversation_log)
+            save_conversation(journal)
+            continue
+            
+        if question.strip().lower().startswith('/cache'):
+            handle_cache_command(cache, question.strip().lower())
             continue
             
-        if question.strip().lower() == '/summarize':
+        if question.strip().lower() == '/stats':
+            print("\n" + metrics.format_table())
+            continue
+            
+        if question.strip().lower().startswith('/hedge'):
+            handle_hedge_command(bots, question.strip())
+            continue
+            
+        if question.strip().lower() == '/pool':
+            print_pool_stats()
+            continue
+            
+        if question.strip().lower() == '/memory':
+            print_history_memory(bots)
+            continue
+            
+        if question.strip().lower().startswith('/race'):
+            race = parse_race_command(question.strip().lower(), len(bot_names), race)
+            continue
+            
+        if question.strip().lower() == '/stream':
+            streaming = not streaming
+            print(f"\nStreaming {'on' if streaming else 'off'}.")
+            continue
+            
+        if question.strip().lower() in ('/summarize', '/summarize polish'):
             if not current_responses:
                 print("\nNo responses to summarize. Please ask a question first.")
                 continue
                 
             try:
                 print("\nGenerating summary...")
-                summary = Summarizer.summarize_outputs(current_responses, bot_names)
+                polish = question.strip().lower().endswith('polish')
+                summary = Summarizer.summarize_outputs(current_responses, bot_names, polish=polish)
                 print("\n" + "=" * 50)
                 print(summary)
                 print("=" * 50)
                 
-                # Add summary to conversation log
-                conversation_log += "\n\n" + "=" * 50 + "\nSUMMARY:\n" + summary + "\n" + "=" * 50
+                # Add summary to conversation journal
+                journal.record_summary(summary)
             except Exception as e:
                 print(f"\nError generating summary: {str(e)}")
                 print("Make sure you have set the HUGGINGFACE_API_KEY in your .env file.")
             continue
         
-        file_path = None
+        upload = None
         file_prompt = None
         
         if question.strip().lower() == '/upload':
-            file_path, file_prompt = upload_file()
-            if file_path:
+            upload, file_prompt = upload_file()
+            if upload:
                 print("Enter your question:")
                 question = input("> ").strip()
             else:
                 continue  # Skip if no file was selected
         
-        # Add question to conversation log
-        conversation_log += f"\nYou: {question}\n"
-        if file_path:
-            conversation_log += f"[File uploaded: {os.path.basename(file_path)}]\n"
+        # Add question to conversation journal
+        journal.record_question(question, upload)
         
         # Clear previous responses when asking a new question
         current_responses = {}
+        view = StreamView(bot_names) if streaming else None
         
-        for bot_name, bot_data in bots.items():
-            try:
-                if file_path:
-                    module_name = bot_data["module_name"]
-                    model = bot_data["instance"]["model"]
-                    
-                    is_compatible, error_msg = FileHandler.is_file_compatible(module_name, model, file_path)
-                    
-                    if not is_compatible:
-                        print(f"\n{bot_name}: {error_msg}")
-                        conversation_log += f"\n{bot_name}: {error_msg}\n"
-                        print("-" * 50)
-                        continue
-                
-                answer = bot_data["ask_function"](
-                    bot_data["instance"], 
-                    question,
-                    file_path=file_path,
-                    file_prompt=file_prompt
-                )
-                
-                # Store the response
-                current_responses[bot_name] = answer
-                
-                # Add to conversation log
-                conversation_log += f"\n{bot_name}: {answer}\n"
-                conversation_log += "-" * 50 + "\n"
-                
-                print(f"\n{bot_name}: {answer}\n")
-                print("-" * 50)
-            except Exception as e:
-                error_message = f"\n{bot_name} error: {str(e)}\n"
-                conversation_log += error_message
-                conversation_log += "-" * 50 + "\n"
-                print(error_message)
-                print("-" * 50)
+        def on_result(bot_name, result):
+            journal.record_result(bot_name, bot_names.index(bot_name), result)
+            if view and result["status"] == "answer" and bots[bot_name].get("stream_function"):
+                view.finish(bot_name)
+                if result.get("hedged"):
+                    print(f"{bot_name} answered with backup model {result['model']}")
+            else:
+                print_result(bot_name, result)
+        
+        results = dispatcher.dispatch(
+            bots,
+            question,
+            upload=upload,
+            file_prompt=file_prompt,
+            on_result=on_result,
+            on_delta=view.write if view else None,
+            first=race
+        )
+        if view:
+            print("-" * 50)
+        journal.flush()
+        metrics.write_prometheus(extra_lines=RateScheduler.prometheus_lines())
+        
+        # Keep responses in a fixed bot order regardless of which bot answered first
+        for bot_name, result in results.items():
+            if result["status"] == "answer":
+                current_responses[bot_name] = result["text"]
+        
+        print_bot_status(bots)
+        
+        # Summarize in the background so '/summarize' is usually instant
+        if current_responses and prefetch:
+            Summarizer.prefetch(current_responses, bot_names, polish=polish)
         
         # After getting all responses
         if current_responses:
             print("Type '/summarize' to get a summary comparing the responses")
             print("Type '/download' to save the conversation")
 
+def print_import_times():
+    """Report how long each bot module and provider SDK took to import"""
+    print("\nImport times:")
+    for name, seconds in sorted(ProviderRegistry.import_times().items(), key=lambda item: -item[1]):
+        print(f"  {name:<20} {seconds * 1000:8.1f} ms")
+    print("-" * 50)
+
 def main():
+    parser = argparse.ArgumentParser(description="Multi-Bot Chat Comparison Tool")
+    parser.add_argument("--profile-imports", action="store_true", help="report per-module import times after setup")
+    args = parser.parse_args()
+    
     clear_screen()
     print("Welcome to Multi-Bot Chat Comparison Tool")
     print("=" * 50)
@@ -280,12 +463,19 @@ def main():
     
     selected_bots = select_bots()
     
+    # Import SDKs and open provider connections while the user is still answering configuration prompts
+    ProviderRegistry.warm([config["module"] for config in selected_bots.values()])
+    
     configured_bots = configure_bots(selected_bots)
     
-    initialized_bots = initialize_bots(configured_bots)
+    cache = ResponseCache()
+    
+    initialized_bots = initialize_bots(configured_bots, cache)
     
     clear_screen()
-    chat_interface(initialized_bots)
+    if args.profile_imports:
+        print_import_times()
+    chat_interface(initialized_bots, cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
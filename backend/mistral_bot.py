@@ -1,14 +1,33 @@
 import os
-from mistralai import Mistral
-import base64
-import mimetypes
-from pathlib import Path
+from transport import Transport
+from file_handler import UnsupportedFileError
+from instrumentation import payload_size, note_call
+from rate_limit import RateScheduler
+from history import HistoryStore
+
+# Imported lazily in initialize_bot so listing models stays fast
+SDK_MODULES = ("mistralai",)
+
+BASE_URL = "https://api.mistral.ai"
+IMAGE_PROFILE = "mistral"
+
+# Budget per API key, matching the Mistral free tier
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 500000
 
 def initialize_bot(audience, role, model=None):
     """Initialize Mistral bot with audience, role and model"""
+    from mistralai import Mistral
+    
     API_KEY = os.getenv('MISTRAL_API_KEY')
     
-    client = Mistral(api_key=API_KEY)
+    base_url = Transport.resolve(BASE_URL)
+    
+    client = Mistral(
+        api_key=API_KEY,
+        server_url=base_url,
+        client=Transport.get_client(base_url)
+    )
     
     system_content = ""
     if audience and role:
@@ -30,83 +49,81 @@ def initialize_bot(audience, role, model=None):
     
     return {
         "client": client,
-        "history": [system_msg],
-        "model": model
+        "history": HistoryStore([system_msg]),
+        "model": model,
+        "scheduler": RateScheduler.for_key(base_url, API_KEY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
     }
 
-def ask(bot, question, file_path=None, file_prompt=None):
-    """Send a question to Mistral and get the response"""
-    if file_path:
-        try:
-            mime_type, _ = mimetypes.guess_type(file_path)
-            file_extension = Path(file_path).suffix.lower().replace('.', '')
-            
-            if bot["model"] == "mistral-large-latest" and mime_type and mime_type.startswith('image/'):
-                with open(file_path, "rb") as image_file:
-                    base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                
-                content = [{
-                    "type": "text",
-                    "text": file_prompt or question
-                }, {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": mime_type,
-                        "data": base64_image
-                    }
-                }]
-                
-                question_msg = {
-                    "role": "user",
-                    "content": content
+def _build_question_msg(bot, question, upload=None, file_prompt=None):
+    """Build the user message for a question, returning (message, error)"""
+    if upload:
+        if bot["model"] == "mistral-large-latest" and upload.is_image:
+            image = upload.image(IMAGE_PROFILE)
+            content = [{
+                "type": "text",
+                "text": file_prompt or question
+            }, {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": image.mime_type,
+                    "data": image.base64
                 }
-            elif mime_type == 'application/pdf' and (bot["model"] == "mistral-medium-latest" or bot["model"] == "mistral-large-latest"):
-                with open(file_path, "rb") as pdf_file:
-                    base64_pdf = base64.b64encode(pdf_file.read()).decode('utf-8')
-                
-                content = [{
-                    "type": "text",
-                    "text": file_prompt or question
-                }, {
-                    "type": "document",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "application/pdf",
-                        "data": base64_pdf
-                    }
-                }]
-                
-                question_msg = {
-                    "role": "user",
-                    "content": content
+            }]
+            
+            question_msg = {
+                "role": "user",
+                "content": content
+            }
+        elif upload.mime_type == 'application/pdf' and (bot["model"] == "mistral-medium-latest" or bot["model"] == "mistral-large-latest"):
+            content = [{
+                "type": "text",
+                "text": file_prompt or question
+            }, {
+                "type": "document",
+                "source": {
+                    "type": "base64",
+                    "media_type": "application/pdf",
+                    "data": upload.base64
                 }
-            else:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        file_content = file.read()
-                    
-                    full_question = f"{file_prompt or question}\n\nFile content:\n{file_content}"
-                    question_msg = {
-                        "role": "user",
-                        "content": full_question
-                    }
-                except UnicodeDecodeError:
-                    return f"Error: This file type is not supported by {bot['model']}."
-        except Exception as e:
-            return f"Error processing file: {str(e)}"
+            }]
+            
+            question_msg = {
+                "role": "user",
+                "content": content
+            }
+        elif upload.prompt_text is not None:
+            full_question = f"{file_prompt or question}\n\nFile content:\n{upload.prompt_text}"
+            question_msg = {
+                "role": "user",
+                "content": full_question
+            }
+        else:
+            return None, f"This file type is not supported by {bot['model']}."
     else:
         question_msg = {
             "role": "user",
             "content": question
         }
     
+    return question_msg, None
+
+def ask(bot, question, upload=None, file_prompt=None):
+    """Send a question to Mistral and get the response"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
     bot["history"].append(question_msg)
     
     try:
-        messages = [msg for msg in bot["history"] if "role" in msg and "content" in msg]
+        messages = bot["history"]
+        request_bytes = payload_size(messages)
         
-        response = bot["client"].chat.complete(
+        response, retries = bot["scheduler"].call(
+            bot["client"].chat.complete,
+            request_bytes // 4,
+            cancel=bot.get("cancel"),
             model=bot["model"],
             messages=messages
         )
@@ -117,11 +134,45 @@ def ask(bot, question, file_path=None, file_prompt=None):
         }
         
         bot["history"].append(answer_msg)
+        note_call(bot, request_bytes, answer_msg["content"], response.usage, retries)
         
         return answer_msg["content"]
     except Exception as e:
         return f"Error: {str(e)}"
 
+def ask_stream(bot, question, upload=None, file_prompt=None):
+    """Send a question to Mistral and yield the response as it is generated, raising if the call fails"""
+    question_msg, error = _build_question_msg(bot, question, upload, file_prompt)
+    if error:
+        raise UnsupportedFileError(error)
+    
+    bot["history"].append(question_msg)
+    
+    messages = bot["history"]
+    request_bytes = payload_size(messages)
+    
+    stream, retries = bot["scheduler"].call_stream(
+        bot["client"].chat.stream,
+        request_bytes // 4,
+        cancel=bot.get("cancel"),
+        model=bot["model"],
+        messages=messages
+    )
+    
+    deltas = []
+    usage = None
+    with stream:
+        for event in stream:
+            delta = event.data.choices[0].delta.content
+            if delta:
+                deltas.append(delta)
+                yield delta
+            if event.data.usage:
+                usage = event.data.usage
+    
+    bot["history"].append({"role": "assistant", "content": "".join(deltas)})
+    note_call(bot, request_bytes, "".join(deltas), usage, retries)
+
 def get_available_models():
     """Return available models for Mistral"""
     return {
@@ -0,0 +1,287 @@
+import os
+import time
+import random
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class CallCancelled(Exception):
+    """Raised when a call is cancelled while it waits for budget or a retry"""
+
+class TokenBucket:
+    """Reservation-based token bucket: callers take tokens now and wait off any deficit"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        # Providers meter per minute, so an idle key may spend its whole minute at once;
+        # a smaller burst would make a single large prompt wait for budget the provider already has
+        self.capacity = max(1.0, float(per_minute))
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        """Take `amount` tokens and return how long the caller must wait before using them"""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount):
+        """Return tokens taken for a call that was never sent"""
+        self.level = min(self.capacity, self.level + amount)
+
+class ProviderStream:
+    """An SDK stream whose first chunk may already have been read
+
+    Closing it, or leaving a `with` block over it, closes the SDK stream and
+    so returns its HTTP connection to the shared pool, even when the reader
+    stops early after a deadline, a race or a hedge.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.iterator = iter(stream)
+        self.pending = []
+
+    def prime(self):
+        """Read the first chunk now, so a lazy stream fails inside the retry loop"""
+        try:
+            self.pending.append(next(self.iterator))
+        except StopIteration:
+            pass
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            return self.pending.pop()
+        return next(self.iterator)
+
+    def close(self):
+        for target in (self.stream, getattr(self.stream, "response", None)):
+            close = getattr(target, "close", None)
+            if callable(close):
+                close()
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RateScheduler:
+    """Request and token budgets for one API key, with 429-aware retries
+
+    Every adapter call goes through `call`, which queues until the key's
+    budget allows it, then retries rate limits, server errors and dropped
+    connections with jittered exponential backoff or the provider's
+    Retry-After. SDK-level retries are turned off so this is the only retry
+    loop.
+    """
+
+    _schedulers = {}
+    _lock = threading.Lock()
+
+    MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+    BACKOFF_BASE = 1.0
+    BACKOFF_CAP = 30.0
+
+    def __init__(self, label, requests_per_minute=None, tokens_per_minute=None):
+        self.label = label
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    @classmethod
+    def for_key(cls, base_url, api_key, requests_per_minute=None, tokens_per_minute=None):
+        """Return the scheduler shared by every bot using this API key on this provider"""
+        fingerprint = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+        label = f"{urlsplit(base_url).netloc}:{fingerprint}"
+        with cls._lock:
+            scheduler = cls._schedulers.get(label)
+            if scheduler is None:
+                scheduler = cls(label, requests_per_minute, tokens_per_minute)
+                cls._schedulers[label] = scheduler
+            return scheduler
+
+    def _wait_for_budget(self, estimated_tokens, cancel=None):
+        if cancel is not None and cancel.is_set():
+            raise CallCancelled(f"Cancelled before calling {self.label}")
+
+        with self.lock:
+            wait = self.requests.reserve(1) if self.requests else 0.0
+            if self.tokens and estimated_tokens:
+                wait = max(wait, self.tokens.reserve(estimated_tokens))
+            wait = max(wait, self.paused_until - time.monotonic())
+            if wait > 0:
+                self.queued += 1
+                self.waited += wait
+
+        if wait <= 0:
+            return
+        # A cancelled caller leaves the queue at once and gives its reservation back to the others
+        cancelled = _pause(wait, cancel)
+        with self.lock:
+            self.queued -= 1
+            if cancelled:
+                if self.requests:
+                    self.requests.refund(1)
+                if self.tokens and estimated_tokens:
+                    self.tokens.refund(estimated_tokens)
+        if cancelled:
+            raise CallCancelled(f"Cancelled while queued for {self.label}")
+
+    def call(self, function, estimated_tokens=0, *args, cancel=None, **kwargs):
+        """Run a provider call within the key's budget, returning (result, retries)
+
+        `cancel` is the caller's threading.Event; once it is set the call is
+        abandoned with CallCancelled instead of being sent after its wait.
+        """
+        attempt = 0
+        while True:
+            self._wait_for_budget(estimated_tokens, cancel)
+            with self.lock:
+                self.in_flight += 1
+                self.calls += 1
+            try:
+                return function(*args, **kwargs), attempt
+            except Exception as e:
+                retryable, retry_after = _classify(e)
+                if not retryable or attempt >= self.MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt, retry_after)
+                with self.lock:
+                    self.retries += 1
+                    if retry_after is not None or _status(e) == 429:
+                        self.rate_limited += 1
+                        # Every caller on this key has to respect the provider's pause, not only this one
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+            if _pause(delay, cancel):
+                raise CallCancelled(f"Cancelled before retrying {self.label}")
+            attempt += 1
+
+    def call_stream(self, function, estimated_tokens=0, *args, cancel=None, **kwargs):
+        """Like `call`, but for streams: the first chunk is fetched so lazy streams fail inside the retry loop"""
+        def open_stream():
+            stream = ProviderStream(function(*args, **kwargs))
+            try:
+                stream.prime()
+            except BaseException:
+                stream.close()
+                raise
+            return stream
+
+        return self.call(open_stream, estimated_tokens, cancel=cancel)
+
+    def settle(self, tokens):
+        """Charge tokens that were only known after the call, such as the completion"""
+        if self.tokens and tokens:
+            with self.lock:
+                self.tokens.reserve(tokens)
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 0.5)
+        return random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+
+    @classmethod
+    def stats(cls):
+        """Queue depth and retry counts per provider key"""
+        with cls._lock:
+            schedulers = list(cls._schedulers.values())
+
+        stats = {}
+        for scheduler in schedulers:
+            with scheduler.lock:
+                stats[scheduler.label] = {
+                    "queued": scheduler.queued,
+                    "in_flight": scheduler.in_flight,
+                    "calls": scheduler.calls,
+                    "retries": scheduler.retries,
+                    "rate_limited": scheduler.rate_limited,
+                    "waited": scheduler.waited
+                }
+        return stats
+
+    @classmethod
+    def prometheus_lines(cls):
+        """Scheduler gauges and counters for Metrics.write_prometheus"""
+        stats = cls.stats()
+        lines = []
+        for name, key, kind, help_text in [
+            ("synapsify_rate_queue_depth", "queued", "gauge", "Calls waiting for rate limit budget"),
+            ("synapsify_rate_limited_total", "rate_limited", "counter", "Rate limit responses from the provider"),
+            ("synapsify_rate_wait_seconds_total", "waited", "counter", "Time calls spent queued for budget")
+        ]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label, values in sorted(stats.items()):
+                lines.append(f'{name}{{key="{label}"}} {values[key]}')
+        return lines
+
+def _pause(seconds, cancel=None):
+    """Sleep for `seconds`, returning True as soon as `cancel` is set"""
+    if cancel is None:
+        time.sleep(seconds)
+        return False
+    return cancel.wait(seconds)
+
+def _status(error):
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def _classify(error):
+    """Return (retryable, retry_after seconds or None) for an SDK exception"""
+    # A replay miss is wrapped by the SDKs like a dropped connection, but retrying can't help
+    cause = error
+    while cause is not None:
+        if type(cause).__name__ == "CassetteMiss":
+            return False, None
+        cause = cause.__cause__ or cause.__context__
+
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS, _retry_after(error) if status in RETRYABLE_STATUS else None
+
+    names = [cls.__name__ for cls in type(error).__mro__]
+    return any("Connection" in name or "Timeout" in name for name in names), None
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        response = getattr(error, "raw_response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import threading
+import importlib
+import importlib.util
+from transport import Transport
+
+class ProviderRegistry:
+    """Resolve bot modules by name, import their SDKs lazily and time every import"""
+
+    _modules = {}
+    _import_times = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def load(cls, module_name):
+        """Import a bot module, which is cheap because adapters defer their SDK imports"""
+        module = cls._modules.get(module_name)
+        if module is not None:
+            return module
+
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except ModuleNotFoundError as e:
+            if e.name != module_name:
+                raise
+            with cls._lock:
+                module = sys.modules.get(module_name) or cls._load_from_file(module_name)
+
+        with cls._lock:
+            cls._import_times.setdefault(module_name, time.perf_counter() - start)
+            cls._modules[module_name] = module
+        return module
+
+    @staticmethod
+    def _load_from_file(module_name):
+        """Load a bot module whose file name uses dashes, such as qwen-bot.py"""
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), module_name.replace("_", "-") + ".py")
+        if not os.path.exists(path):
+            raise ModuleNotFoundError(f"No module named '{module_name}'", name=module_name)
+
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return module
+
+    @classmethod
+    def load_sdk(cls, module_name):
+        """Import the provider SDKs a bot module needs"""
+        module = cls.load(module_name)
+        for sdk_name in getattr(module, "SDK_MODULES", ()):
+            if sdk_name in sys.modules:
+                continue
+            # No registry lock here, importlib already serialises imports of the same module
+            start = time.perf_counter()
+            importlib.import_module(sdk_name)
+            with cls._lock:
+                cls._import_times.setdefault(sdk_name, time.perf_counter() - start)
+        return module
+
+    @classmethod
+    def warm(cls, module_names):
+        """Import SDKs and pre-connect to providers in a background thread"""
+        def warm_up():
+            base_urls = []
+            for module_name in module_names:
+                try:
+                    module = cls.load_sdk(module_name)
+                except Exception:
+                    # initialize_bots reports the real error later
+                    continue
+                if getattr(module, "BASE_URL", None) and module.BASE_URL not in base_urls:
+                    base_urls.append(module.BASE_URL)
+
+            for base_url in base_urls:
+                Transport.preconnect(base_url)
+
+        thread = threading.Thread(target=warm_up, name="provider-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def import_times(cls):
+        with cls._lock:
+            return dict(cls._import_times)
\ No newline at end of file
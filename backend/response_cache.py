@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from history import Turn, HistoryStore
+from attachments import AttachmentManager
+
+class ResponseCache:
+    """Persistent SQLite cache of bot answers, keyed by everything that shapes the request
+
+    A cached entry stores the answer together with the history entries the adapter
+    appended, so a hit leaves the bot in exactly the state a real call would.
+    """
+
+    def __init__(self, path=None, max_entries=5000, ttl=7 * 24 * 3600, enabled=None):
+        self.path = path or os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        if enabled is None:
+            enabled = os.getenv("RESPONSE_CACHE", "").lower() in ("1", "true", "on")
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, answer TEXT, delta TEXT, created REAL, accessed REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        return self.connection
+
+    @staticmethod
+    def make_key(module_name, bot, question, upload=None, file_prompt=None):
+        """Hash the model, system prompt, history and question into a cache key"""
+        payload = {
+            "module": module_name,
+            "model": bot["model"],
+            "system": bot.get("system_instruction"),
+            "first_message": bot.get("first_message"),
+            "history": HistoryStore.fingerprint(bot["history"]),
+            "question": question,
+            "file_prompt": file_prompt,
+            "attachment": upload.sha256 if upload else None,
+            # The same file is sent whole or as a digest, which are different requests
+            "full_data": upload.full_data if upload else None
+        }
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (answer, history_delta) for a live entry, or None
+
+        An entry whose turns refer to an uploaded file handle lives only as long
+        as the handle, so a hit never puts a dead file reference in a history.
+        """
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT answer, delta, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            delta = json.loads(row[1]) if row is not None else None
+
+            if row is None or now - row[2] > self.ttl or not all(AttachmentManager.is_live(reference) for reference in _file_handles(delta)):
+                if row is not None:
+                    connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    connection.commit()
+                self.misses += 1
+                return None
+
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+            return row[0], delta
+
+    def put(self, key, answer, delta):
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, delta, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, answer, json.dumps(delta, default=str), now, now)
+            )
+            # Evict the least recently used entries beyond the size limit
+            connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            connection.commit()
+
+    def clear(self):
+        with self.lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def wrap(self, module_name, ask):
+        """Wrap an adapter's ask function with this cache"""
+        def cached_ask(bot, question, upload=None, file_prompt=None):
+            if not self.enabled:
+                return ask(bot, question, upload=upload, file_prompt=file_prompt)
+
+            key = self.make_key(module_name, bot, question, upload, file_prompt)
+            hit = self.get(key)
+            if hit:
+                answer, delta = hit
+                self._replay(bot, delta)
+                return answer
+
+            before = len(bot["history"])
+            answer = ask(bot, question, upload=upload, file_prompt=file_prompt)
+            self._store(key, bot, before, answer)
+            return answer
+
+        return cached_ask
+
+    def wrap_stream(self, module_name, ask_stream):
+        """Wrap an adapter's ask_stream function with this cache"""
+        def cached_ask_stream(bot, question, upload=None, file_prompt=None):
+            if not self.enabled:
+                yield from ask_stream(bot, question, upload=upload, file_prompt=file_prompt)
+                return
+
+            key = self.make_key(module_name, bot, question, upload, file_prompt)
+            hit = self.get(key)
+            if hit:
+                answer, delta = hit
+                self._replay(bot, delta)
+                yield answer
+                return
+
+            before = len(bot["history"])
+            deltas = []
+            for delta in ask_stream(bot, question, upload=upload, file_prompt=file_prompt):
+                deltas.append(delta)
+                yield delta
+            self._store(key, bot, before, "".join(deltas))
+
+        return cached_ask_stream
+
+    @staticmethod
+    def _replay(bot, delta):
+        bot["history"].extend(delta)
+        bot["last_call"] = {"model": bot["model"], "cached": True}
+        if bot.get("first_message"):
+            # Gemini folds the system instruction into its first request only
+            bot["first_message"] = False
+
+    def _store(self, key, bot, before, answer):
+        """Cache a successful answer with the history entries it produced
+
+        Only a turn the adapter completed, ending in the model's reply, is
+        stored; anything else would replay a question left unanswered.
+        """
+        if answer is None or answer.startswith("Error"):
+            return
+        delta = [canonical_message(message) for message in bot["history"][before:]]
+        if delta and delta[-1].get("role") in ("assistant", "model"):
+            self.put(key, answer, delta)
+
+def _file_handles(delta):
+    """References to provider-side uploads in a cached history delta"""
+    for message in delta:
+        parts = message.get("parts") or message.get("content")
+        if not isinstance(parts, list):
+            continue
+        for part in parts:
+            if "file_data" in part:
+                yield part["file_data"]["file_uri"]
+            elif part.get("type") == "file":
+                yield part["file"]["file_id"]
+
+def canonical_message(message):
+    """Turn a history entry, dict or SDK message object, into a plain JSON-able dict"""
+    return Turn.of(message)
\ No newline at end of file
@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from dotenv import load_dotenv
+from main import AVAILABLE_BOTS, initialize_bots
+from registry import ProviderRegistry
+from dispatcher import Dispatcher
+from instrumentation import Metrics
+from response_cache import ResponseCache
+from summarizer import Summarizer
+from upload import Upload
+from extraction import DocumentExtractor
+from transport import Transport
+
+load_dotenv()
+
+# The frontend's provider ids, from src/utils/chatUtils.ts
+PROVIDER_MODULES = {
+    "openai": "chatgpt_bot",
+    "deepseek": "deepseek_bot",
+    "google": "gemini_bot",
+    "meta": "llama_bot",
+    "mistral": "mistral_bot",
+    "qwen": "qwen_bot"
+}
+BOT_NAMES = {bot["module"]: bot["name"] for bot in AVAILABLE_BOTS.values()}
+
+SESSION_TTL_SECONDS = float(os.getenv("SERVER_SESSION_TTL_SECONDS", "3600"))
+UPLOAD_DIR = os.getenv("SERVER_UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("SERVER_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Recent calls kept per bot and model for hedging thresholds
+METRICS_WINDOW = int(os.getenv("SERVER_METRICS_WINDOW", "500"))
+CORS_ORIGIN = os.getenv("CORS_ORIGIN", "*")
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": CORS_ORIGIN,
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, X-Session-Id",
+    "Access-Control-Expose-Headers": "X-Session-Id"
+}
+
+def resolve_model(module_name, model):
+    """Map a frontend model name such as "gpt-4.1-nano" to the adapter's model id, or None"""
+    models = list(ProviderRegistry.load(module_name).get_available_models().values())
+    if model in models:
+        return model
+    # The frontend drops provider prefixes and version suffixes; the shortest match is the closest
+    matches = [candidate for candidate in models if candidate.split("/")[-1].startswith(model)]
+    return min(matches, key=len) if matches else None
+
+def panel_text(result):
+    """What a panel shows for a result, matching the terminal's wording"""
+    if result["status"] in ("answer", "incompatible", "skipped", "cancelled"):
+        return result["text"]
+    if result["text"].startswith("Error"):
+        return result["text"]
+    return f"Error: {result['text']}"
+
+class ChatServer:
+    """Serve the React frontend's chatService with the same adapters as the terminal chat
+
+    Each browser session keeps its own bots, one per panel, and a panel's bot
+    is rebuilt when its provider, model, audience or role changes or its
+    conversation starts over. Provider calls run on the dispatcher's worker
+    threads and each blocking dispatch on the server's executor, so the event
+    loop only parses requests and forwards tokens, and one slow provider never
+    holds up another session. Once every worker is held by calls that haven't
+    returned, new panels are skipped at once instead of waiting for a thread.
+    """
+
+    def __init__(self, workers=None):
+        workers = workers or int(os.getenv("SERVER_WORKERS", "64"))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server")
+        self.metrics = Metrics(window=METRICS_WINDOW)
+        self.dispatcher = Dispatcher(max_workers=workers, metrics=self.metrics)
+        self.cache = ResponseCache()
+        self.sessions = {}
+        self.uploads = {}
+
+    def app(self):
+        app = web.Application(middlewares=[self.cors], client_max_size=MAX_UPLOAD_BYTES)
+        app.router.add_get("/api/health", self.health)
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_post("/api/chat/stream", self.chat_stream)
+        app.router.add_post("/api/upload", self.upload)
+        app.router.add_post("/api/summary", self.summary)
+        app.on_startup.append(self._start_sweeper)
+        app.on_cleanup.append(self._cleanup)
+        return app
+
+    @web.middleware
+    async def cors(self, request, handler):
+        if request.method == "OPTIONS":
+            response = web.Response()
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                response = e
+        if not response.prepared:
+            response.headers.update(CORS_HEADERS)
+        return response
+
+    async def _run(self, function, *args, **kwargs):
+        """Run blocking work on the server's executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    @staticmethod
+    async def _hold(awaitable):
+        """Await work on a session's bots to the end, even if the request waiting for it is cancelled
+
+        Called inside the session lock, so the lock is only released once the
+        worker threads are done with the bots and the next turn can't overlap.
+        """
+        future = asyncio.ensure_future(awaitable)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait({future})
+            raise
+
+    def _session(self, request, body):
+        session_id = request.headers.get("X-Session-Id") or body.get("sessionId") or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = {"id": session_id, "panels": {}, "lock": asyncio.Lock()}
+            self.sessions[session_id] = session
+        session["used"] = time.monotonic()
+        return session
+
+    def _panel_bots(self, session, panels):
+        """Return ({label: bot_data}, {label: panel id}, {panel id: error}) for a request's panels"""
+        bots, labels, errors = {}, {}, {}
+        for panel in panels:
+            panel_id = panel["id"]
+            module_name = PROVIDER_MODULES.get(panel.get("provider"))
+            if module_name is None:
+                errors[panel_id] = f"Error: unknown provider {panel.get('provider')}"
+                continue
+            model = resolve_model(module_name, panel.get("model"))
+            if model is None:
+                errors[panel_id] = f"Error: model {panel.get('model')} is not available for {BOT_NAMES[module_name]}"
+                continue
+
+            label = f"{BOT_NAMES[module_name]} ({panel.get('model')})"
+            if label in bots:
+                label = f"{label} #{panel_id}"
+
+            signature = (module_name, model, panel.get("audience") or "", panel.get("role") or "")
+            kept = session["panels"].get(panel_id)
+            # Only the new question in the panel means its conversation was cleared or just started
+            if kept is None or kept[0] != signature or len(panel.get("messages") or []) <= 1:
+                config = {"module": module_name, "model": model, "audience": signature[2], "role": signature[3]}
+                created = initialize_bots({label: config}, self.cache)
+                if label not in created:
+                    errors[panel_id] = f"Error: could not start {BOT_NAMES[module_name]}"
+                    continue
+                kept = (signature, created[label])
+                session["panels"][panel_id] = kept
+
+            bots[label] = kept[1]
+            labels[label] = panel_id
+        return bots, labels, errors
+
+    async def _summarize(self, results, labels):
+        responses = {label: result["text"] for label, result in results.items() if result["status"] == "answer"}
+        if len(responses) < 2:
+            return None
+        return await self._run(Summarizer.summarize_outputs, responses, list(labels))
+
+    async def _prepare_turn(self, request):
+        body = await request.json()
+        if not body.get("prompt") or not body.get("panels"):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "prompt and panels are required"}), content_type="application/json")
+        upload = None
+        if body.get("fileId"):
+            upload, _, path = self.uploads.get(body["fileId"], (None, None, None))
+            if upload is None:
+                raise web.HTTPNotFound(text=json.dumps({"error": "unknown fileId"}), content_type="application/json")
+            self.uploads[body["fileId"]] = (upload, time.monotonic(), path)
+        return body, self._session(request, body), upload
+
+    async def health(self, request):
+        return web.json_response({"status": "ok", "sessions": len(self.sessions)})
+
+    async def chat(self, request):
+        """ChatRequest in, ChatResponse out: {"panelResponses": {panel id: text}, "summary"}"""
+        body, session, upload = await self._prepare_turn(request)
+        async with session["lock"]:
+            bots, labels, errors = await self._hold(self._run(self._panel_bots, session, body["panels"]))
+            results = await self._hold(self._run(self.dispatcher.dispatch, bots, body["prompt"],
+                                                 upload=upload, file_prompt=body.get("filePrompt")))
+
+        panel_responses = dict(errors)
+        panel_responses.update({labels[label]: panel_text(result) for label, result in results.items()})
+        response = {"panelResponses": panel_responses, "sessionId": session["id"]}
+        if body.get("enableSummary") and len(body["panels"]) > 1:
+            summary = await self._summarize(results, labels)
+            if summary:
+                response["summary"] = summary
+        return web.json_response(response, headers={"X-Session-Id": session["id"]})
+
+    async def chat_stream(self, request):
+        """The same turn as /api/chat, sent as server-sent events while the panels answer
+
+        Events are "delta" ({panelId, text}) for each streamed token run,
+        "result" ({panelId, status, text, model, latency}) when a panel is
+        done, "summary" ({summary}) and finally "done" ({sessionId}).
+        """
+        body, session, upload = await self._prepare_turn(request)
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Session-Id": session["id"],
+            **CORS_HEADERS
+        })
+        await response.prepare(request)
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        client = {"connected": True}
+
+        async def send(event, data):
+            # Once the browser has gone the turn still runs to the end, it just isn't written anywhere
+            if not client["connected"]:
+                return
+            try:
+                await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            except ConnectionResetError:
+                client["connected"] = False
+
+        async with session["lock"]:
+            bots, labels, errors = await self._hold(self._run(self._panel_bots, session, body["panels"]))
+            for panel_id, text in errors.items():
+                await send("result", {"panelId": panel_id, "status": "error", "text": text})
+
+            # Worker threads hand events to the loop, which alone writes to the client
+            def on_delta(label, delta):
+                loop.call_soon_threadsafe(events.put_nowait, ("delta", {"panelId": labels[label], "text": delta}))
+
+            def on_result(label, result):
+                loop.call_soon_threadsafe(events.put_nowait, ("result", {
+                    "panelId": labels[label],
+                    "status": result["status"],
+                    "text": panel_text(result),
+                    "model": result.get("model"),
+                    "latency": result.get("latency")
+                }))
+
+            turn = asyncio.ensure_future(self._run(
+                self.dispatcher.dispatch, bots, body["prompt"], upload=upload,
+                file_prompt=body.get("filePrompt"), on_result=on_result, on_delta=on_delta
+            ))
+            turn.add_done_callback(lambda _: events.put_nowait(None))
+            try:
+                while True:
+                    event = await events.get()
+                    if event is None:
+                        break
+                    await send(*event)
+            finally:
+                results = await self._hold(turn)
+
+        if client["connected"] and body.get("enableSummary") and len(body["panels"]) > 1:
+            summary = await self._summarize(results, labels)
+            if summary:
+                await send("summary", {"summary": summary})
+        await send("done", {"sessionId": session["id"]})
+        return response
+
+    async def upload(self, request):
+        """Store a multipart "file" field and return {"fileId", "name", "mimeType", "size"}"""
+        reader = await request.multipart()
+        field = await reader.next()
+        while field is not None and field.name != "file":
+            field = await reader.next()
+        if field is None or not field.filename:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "a file field is required"}), content_type="application/json")
+
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        name = os.path.basename(field.filename)
+        temporary = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temporary, "wb") as file:
+                while True:
+                    block = await field.read_chunk(1024 * 1024)
+                    if not block:
+                        break
+                    # client_max_size doesn't cover a streamed multipart body, so the limit is counted here
+                    size += len(block)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise web.HTTPRequestEntityTooLarge(
+                            max_size=MAX_UPLOAD_BYTES,
+                            actual_size=size,
+                            text=json.dumps({"error": f"files are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}),
+                            content_type="application/json"
+                        )
+                    digest.update(block)
+                    file.write(block)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        # Named by content, keeping the extension the mime type is guessed from
+        path = os.path.join(UPLOAD_DIR, digest.hexdigest() + os.path.splitext(name)[1].lower())
+        os.replace(temporary, path)
+        upload = (await self._run(Upload.from_path, path)).renamed(name)
+        DocumentExtractor.prefetch(upload)
+
+        file_id = upload.sha256
+        self.uploads[file_id] = (upload, time.monotonic(), path)
+        return web.json_response({"fileId": file_id, "name": name, "mimeType": upload.mime_type, "size": upload.size})
+
+    async def summary(self, request):
+        """{"responses": {name: text}} in, {"summary"} out, for chatService.generateSummary"""
+        body = await request.json()
+        responses = body.get("responses") or {}
+        summary = await self._run(Summarizer.summarize_outputs, responses, list(responses))
+        return web.json_response({"summary": summary})
+
+    async def _start_sweeper(self, app):
+        app["sweeper"] = asyncio.ensure_future(self._sweep())
+
+    async def _sweep(self):
+        """Drop sessions and uploads, files included, that nobody has used for a while"""
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.monotonic() - SESSION_TTL_SECONDS
+            for session_id, session in list(self.sessions.items()):
+                if session["used"] < cutoff and not session["lock"].locked():
+                    del self.sessions[session_id]
+            for file_id, (_, used, path) in list(self.uploads.items()):
+                if used < cutoff:
+                    del self.uploads[file_id]
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    async def _cleanup(self, app):
+        app["sweeper"].cancel()
+        self.dispatcher.shutdown()
+        Summarizer.shutdown()
+        DocumentExtractor.shutdown()
+        Transport.close_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for the React frontend")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, help="threads for provider calls (default SERVER_WORKERS or 64)")
+    args = parser.parse_args()
+
+    web.run_app(ChatServer(args.workers).app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import threading
+
+class StreamView:
+    """Interleave live token streams from several bots in one terminal, a line at a time"""
+
+    MAX_LINE = 100
+
+    def __init__(self, bot_names):
+        self.width = max(len(name) for name in bot_names)
+        self.buffers = {name: "" for name in bot_names}
+        self.lock = threading.Lock()
+
+    def write(self, bot_name, delta):
+        """Buffer a delta and print every line it completes"""
+        with self.lock:
+            buffer = self.buffers[bot_name] + delta
+            *lines, buffer = buffer.split("\n")
+            
+            # Wrap long unbroken output so slow newlines don't hide progress
+            while len(buffer) > self.MAX_LINE:
+                cut = buffer.rfind(" ", 0, self.MAX_LINE)
+                if cut <= 0:
+                    cut = self.MAX_LINE
+                lines.append(buffer[:cut])
+                buffer = buffer[cut:].lstrip(" ")
+            
+            self.buffers[bot_name] = buffer
+            for line in lines:
+                self._print_line(bot_name, line)
+
+    def finish(self, bot_name):
+        """Flush whatever is left of a bot's stream"""
+        with self.lock:
+            if self.buffers[bot_name]:
+                self._print_line(bot_name, self.buffers[bot_name])
+            self.buffers[bot_name] = ""
+            self._print_line(bot_name, "[done]")
+
+    def _print_line(self, bot_name, line):
+        print(f"{bot_name:>{self.width}} | {line}")
\ No newline at end of file
@@ -1,30 +1,198 @@
 import os
-from google import genai
-from google.genai import types
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from transport import Transport
+
+# Same endpoint the Gemini bot uses, so summaries share its connection pool and cassettes
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+SUMMARY_MODEL = "gemini-1.5-flash-8b"
+
+# Largest slice of one response sent to the summary model in a single map call, in tokens
+SUMMARY_CHUNK_TOKENS = {
+    "gemini-1.5-flash-8b": 24000,
+    "gemini-1.5-flash": 48000,
+    "gemini-2.0-flash": 48000
+}
+DEFAULT_CHUNK_TOKENS = 8000
+# Responses shorter than this go to the merge step as they are
+MAP_MIN_TOKENS = 1500
 
 class Summarizer:
     """Helper class to summarize and compare responses from different bots"""
     
+    MAX_CACHED = 64
+    
+    _clients = {}
+    _summaries = OrderedDict()
+    _pending = {}
+    _lock = threading.Lock()
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+    _map_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="summary-map")
+    
+    @classmethod
+    def _client(cls, api_key):
+        """Return the Gemini client for an API key, created once on the shared HTTP transport"""
+        with cls._lock:
+            client = cls._clients.get(api_key)
+            if client is not None:
+                return client
+        
+        from google import genai
+        from google.genai import types
+        
+        base_url = Transport.resolve(GEMINI_BASE_URL)
+        if "httpx_client" in types.HttpOptions.model_fields:
+            http_options = types.HttpOptions(base_url=base_url, httpx_client=Transport.get_client(base_url))
+        else:
+            http_options = types.HttpOptions(base_url=base_url)
+        client = genai.Client(api_key=api_key, http_options=http_options)
+        
+        with cls._lock:
+            return cls._clients.setdefault(api_key, client)
+    
     @staticmethod
-    def summarize_outputs(responses, bot_names):
-        """Use Gemini 1.5 Pro to summarize and compare outputs from different bots"""
+    def summary_key(responses, bot_names, polish=False):
+        """Hash of the response set, the bot order and the summary kind"""
+        payload = [polish, [[bot_name, responses[bot_name]] for bot_name in bot_names if bot_name in responses]]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+    
+    @classmethod
+    def prefetch(cls, responses, bot_names, polish=False):
+        """Start summarizing in the background so a later /summarize is answered from the cache"""
+        if not responses:
+            return
+        key = cls.summary_key(responses, bot_names, polish)
+        with cls._lock:
+            if key in cls._summaries or key in cls._pending:
+                return
+            cls._pending[key] = cls._executor.submit(cls._summarize, key, dict(responses), list(bot_names), polish)
+    
+    @classmethod
+    def summarize_outputs(cls, responses, bot_names, polish=False):
+        """Return the summary for a response set, from the cache, a prefetch in flight or a fresh run"""
         if not responses:
             return "No responses to summarize."
+        
+        key = cls.summary_key(responses, bot_names, polish)
+        with cls._lock:
+            if key in cls._summaries:
+                cls._summaries.move_to_end(key)
+                return cls._summaries[key]
+            pending = cls._pending.get(key)
+        
+        if pending is not None:
+            return pending.result()
+        return cls._summarize(key, responses, bot_names, polish)
+    
+    @classmethod
+    def _summarize(cls, key, responses, bot_names, polish):
+        try:
+            summary, cacheable = cls._compare(responses, bot_names, polish)
+        finally:
+            with cls._lock:
+                cls._pending.pop(key, None)
+        
+        if cacheable:
+            with cls._lock:
+                cls._summaries[key] = summary
+                if len(cls._summaries) > cls.MAX_CACHED:
+                    cls._summaries.popitem(last=False)
+        return summary
+    
+    @staticmethod
+    def _chunks(text, limit):
+        """Split text into pieces of at most `limit` characters, at paragraph breaks where possible"""
+        chunks = []
+        current = ""
+        for paragraph in text.split("\n\n"):
+            while len(paragraph) > limit:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(paragraph[:limit])
+                paragraph = paragraph[limit:]
+            if current and len(current) + len(paragraph) + 2 > limit:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    @classmethod
+    def _condense_chunk(cls, client, chunk):
+        """Map step: reduce one slice of a response to its points, or keep the slice if that fails"""
+        from google.genai import types
+        
+        input_text = "List every distinct point this AI response makes, one short sentence per line. Keep facts, numbers and recommendations; drop examples and filler.\n\n" + chunk
+        try:
+            response = client.models.generate_content(
+                model=SUMMARY_MODEL,
+                contents=[types.Content(role="user", parts=[types.Part.from_text(text=input_text)])],
+                config=types.GenerateContentConfig(response_mime_type="text/plain"),
+            )
+            return response.text or chunk
+        except Exception:
+            return chunk
+    
+    @classmethod
+    def _map_responses(cls, client, responses, bot_names):
+        """Condense long responses chunk by chunk, all chunks of all bots in parallel
+
+        Latency follows the largest chunk rather than the total length, and the
+        merge step only ever sees condensed points.
+        """
+        limit = SUMMARY_CHUNK_TOKENS.get(SUMMARY_MODEL, DEFAULT_CHUNK_TOKENS) * 4
+        futures = {}
+        for bot_name in bot_names:
+            text = responses.get(bot_name)
+            if text is not None and len(text) > MAP_MIN_TOKENS * 4:
+                futures[bot_name] = [cls._map_executor.submit(cls._condense_chunk, client, chunk)
+                                     for chunk in cls._chunks(text, limit)]
+        
+        mapped = {}
+        for bot_name in bot_names:
+            if bot_name in futures:
+                mapped[bot_name] = "\n".join(future.result() for future in futures[bot_name])
+            elif bot_name in responses:
+                mapped[bot_name] = responses[bot_name]
+        return mapped
+    
+    @classmethod
+    def _compare(cls, responses, bot_names, polish):
+        """Compare outputs from different bots locally, optionally rewritten by Gemini 1.5 Flash-8B
+
+        The polished summary is a map-reduce: long responses are condensed in
+        parallel, the condensed points are clustered locally, and one merge call
+        rewrites the clusters. Returns (summary, whether it may be cached);
+        summaries with a failed polish are not kept.
+        """
+        # Imported here to keep NumPy off the startup path
+        from comparison import ResponseComparison
+        
+        local_summary = ResponseComparison.format(ResponseComparison.compare(responses, bot_names))
+        if not polish:
+            return local_summary, True
             
         api_key = os.environ.get("SUMMARIZER_API_KEY")
         if not api_key:
-            return "Error: SUMMARIZER_API_KEY not found in environment variables."
+            return f"{local_summary}\n\n(Not polished: SUMMARIZER_API_KEY not found in environment variables.)", False
 
         try:
-            client = genai.Client(api_key=api_key)
-            model = "gemini-1.5-flash-8b"
+            from google.genai import types
+            
+            client = cls._client(api_key)
+            model = SUMMARY_MODEL
             
-            # Prepare input for Gemini
-            input_text = "Compare the following AI responses and identify: 1) Common points shared across all responses, and 2) Unique points made only by specific models.\n\n"
+            mapped = cls._map_responses(client, responses, bot_names)
             
-            for bot_name in bot_names:
-                if bot_name in responses:
-                    input_text += f"### {bot_name} response:\n{responses[bot_name]}\n\n"
+            # Gemini only sees the pre-clustered points, not the full responses
+            input_text = "These points were extracted from several AI responses and grouped by similarity. Rewrite them as a concise comparison that identifies: 1) Common points shared across all responses, and 2) Unique points made only by specific models. Do not add points that are not listed.\n\n"
+            input_text += ResponseComparison.format(ResponseComparison.compare(mapped, bot_names))
             
             contents = [
                 types.Content(
@@ -45,7 +213,42 @@ class Summarizer:
                 config=generate_content_config,
             )
             
-            return response.text
+            return response.text, True
             
         except Exception as e:
-            return f"Error generating summary: {str(e)}"
\ No newline at end of file
+            return f"{local_summary}\n\n(Error polishing summary: {str(e)})", False
+    
+    @classmethod
+    def shutdown(cls):
+        """Drop summaries that haven't started yet when the session ends"""
+        cls._executor.shutdown(wait=False, cancel_futures=True)
+        cls._map_executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def condense_history(transcript, previous_summary=""):
+        """Fold older conversation turns into a short rolling summary, or None if unavailable"""
+        api_key = os.environ.get("SUMMARIZER_API_KEY")
+        if not api_key:
+            return None
+        
+        try:
+            from google.genai import types
+            
+            client = Summarizer._client(api_key)
+            model = SUMMARY_MODEL
+            
+            input_text = "Condense this conversation into a short summary that keeps every fact, decision and open question needed to continue it.\n\n"
+            if previous_summary:
+                input_text += f"Summary so far:\n{previous_summary}\n\n"
+            input_text += f"New turns:\n{transcript}"
+            
+            response = client.models.generate_content(
+                model=model,
+                contents=[types.Content(role="user", parts=[types.Part.from_text(text=input_text)])],
+                config=types.GenerateContentConfig(response_mime_type="text/plain"),
+            )
+            
+            return response.text
+            
+        except Exception:
+            return None
\ No newline at end of file
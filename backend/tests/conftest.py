@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_provider import FakeProvider, FakeProviderConfig
+from circuit_breaker import CircuitBreaker
+from rate_limit import RateScheduler
+from response_cache import ResponseCache
+from main import initialize_bots
+
+@pytest.fixture(autouse=True)
+def fresh_registries():
+    """Breakers and schedulers are shared per provider, so every test starts with none"""
+    CircuitBreaker._breakers.clear()
+    RateScheduler._schedulers.clear()
+    yield
+    CircuitBreaker._breakers.clear()
+    RateScheduler._schedulers.clear()
+
+@pytest.fixture
+def fake_provider():
+    """Start fake providers on free local ports: fake_provider(latency_ms=..., ...) returns one"""
+    providers = []
+
+    def start(**settings):
+        settings = {"latency_ms": 20.0, "latency_sigma": 0.0, "tokens_per_second": 2000.0, "answer_tokens": 5, "seed": 1, **settings}
+        provider = FakeProvider(port=0, config=FakeProviderConfig(**settings)).start()
+        providers.append(provider)
+        return provider
+
+    yield start
+    for provider in providers:
+        provider.stop()
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "cache.sqlite"), enabled=False)
+
+@pytest.fixture
+def make_bot(monkeypatch, cache):
+    """Initialize a ChatGPT bot talking to a fake provider, the way the terminal chat does"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    def make(provider, label="ChatGPT", response_cache=None):
+        monkeypatch.setenv("PROVIDER_BASE_URL", provider.base_url)
+        config = {"module": "chatgpt_bot", "model": None, "audience": "", "role": ""}
+        bots = initialize_bots({label: config}, response_cache or cache)
+        assert label in bots
+        return bots[label]
+
+    return make
@@ -0,0 +1,39 @@
+import numpy as np
+
+from comparison import ResponseComparison
+
+def test_average_linkage_does_not_chain():
+    # b is as close to a as to c, but a and c are unrelated
+    a = np.array([1.0, 0.0, 0.0])
+    b = np.array([0.5, np.sqrt(3) / 2, 0.0])
+    c = np.array([-0.5, np.sqrt(3) / 2, 0.0])
+
+    clusters, similarity = ResponseComparison.cluster(np.array([a, b, c]), threshold=0.45)
+
+    assert clusters == [[0, 1], [2]]
+    assert similarity.shape == (3, 3)
+
+def test_identical_rows_share_a_cluster():
+    vectors = ResponseComparison.vectorize([
+        "Caching answers saves money on repeated prompts.",
+        "Streaming tokens improves perceived latency for users.",
+        "Caching answers saves money on repeated prompts."
+    ])
+
+    clusters, _ = ResponseComparison.cluster(vectors)
+
+    assert sorted(clusters) == [[0, 2], [1]]
+
+def test_compare_finds_common_and_unique_points():
+    responses = {
+        "A": "Caching answers saves money on repeated prompts. Rust has a strict borrow checker for memory safety.",
+        "B": "Caching answers saves money on repeated prompts. Bananas are rich in potassium and fiber."
+    }
+
+    comparison = ResponseComparison.compare(responses, ["A", "B"])
+
+    assert [point["text"] for point in comparison["common"]] == ["Caching answers saves money on repeated prompts."]
+    assert comparison["common"][0]["bots"] == ["A", "B"]
+    assert [point["text"] for point in comparison["unique"]["A"]] == ["Rust has a strict borrow checker for memory safety."]
+    assert [point["text"] for point in comparison["unique"]["B"]] == ["Bananas are rich in potassium and fiber."]
+    assert comparison["shared"] == []
@@ -0,0 +1,49 @@
+import json
+
+from upload import Upload
+
+def test_csv_digest(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text("region;amount;note\nnorth;10;\nsouth;20;late\nnorth;30;\n")
+
+    digest = Upload.from_path(str(path)).digest
+
+    assert digest.startswith("Digest of sales.csv (3 rows x 3 columns)")
+    assert "- region" in digest
+    assert "- amount (integer)" in digest
+    assert "north" in digest
+
+def test_json_digest(tmp_path):
+    path = tmp_path / "orders.json"
+    path.write_text(json.dumps({"orders": [{"id": 1, "total": 9.5}, {"id": 2, "total": 12.0}, {"id": 3}]}))
+
+    digest = Upload.from_path(str(path)).digest
+
+    assert digest.startswith("Digest of orders.json (JSON)")
+    assert "orders: array (3 items)" in digest
+    assert "records at" in digest
+    assert "(3 rows x 2 columns)" in digest
+
+def test_digest_reads_the_bytes_already_in_memory(tmp_path):
+    path = tmp_path / "gone.csv"
+    path.write_text("a,b\n1,2\n")
+    upload = Upload.from_path(str(path))
+    path.unlink()
+
+    assert upload.digest.startswith("Digest of gone.csv (1 rows x 2 columns)")
+
+def test_full_data_sends_the_raw_file(tmp_path):
+    path = tmp_path / "raw.csv"
+    path.write_text("a,b\n1,2\n")
+    upload = Upload.from_path(str(path))
+
+    assert upload.prompt_text == upload.digest
+    assert upload.with_full_data().prompt_text == "a,b\n1,2\n"
+
+def test_malformed_json_falls_back_to_text(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('{"a": ')
+    upload = Upload.from_path(str(path))
+
+    assert upload.digest is None
+    assert upload.prompt_text == '{"a": '
@@ -0,0 +1,68 @@
+import time
+
+from dispatcher import Dispatcher
+from circuit_breaker import CircuitBreaker
+from rate_limit import RateScheduler
+
+def test_every_bot_answers_and_keeps_its_turn(fake_provider, make_bot):
+    provider = fake_provider()
+    bots = {"A": make_bot(provider, "A"), "B": make_bot(provider, "B")}
+    dispatcher = Dispatcher(max_workers=4, deadline=10)
+
+    results = dispatcher.dispatch(bots, "What is a circuit breaker?")
+
+    assert list(results) == ["A", "B"]
+    for bot_data in bots.values():
+        assert len(bot_data["instance"]["history"]) == 3
+        assert "cancel" not in bot_data["instance"]
+    assert all(result["status"] == "answer" for result in results.values())
+    assert results["A"]["text"].startswith("Fake ")
+    dispatcher.shutdown()
+
+def test_deadline_abandonment_leaves_history_untouched(fake_provider, make_bot):
+    bot_data = make_bot(fake_provider(latency_ms=800.0))
+    history = bot_data["instance"]["history"]
+    turns = list(history)
+    dispatcher = Dispatcher(max_workers=2, deadline=0.2)
+
+    results = dispatcher.dispatch({"A": bot_data}, "Too slow?")
+    assert results["A"]["status"] == "timeout"
+
+    # The abandoned call still gets its answer, which must not reach the real history
+    time.sleep(1.0)
+    assert bot_data["instance"]["history"] is history
+    assert list(history) == turns
+    dispatcher.shutdown()
+
+def test_race_cancels_the_slower_bots(fake_provider, make_bot):
+    fast = make_bot(fake_provider(latency_ms=20.0), "Fast")
+    slow = make_bot(fake_provider(latency_ms=2000.0), "Slow")
+    slow_history = list(slow["instance"]["history"])
+    dispatcher = Dispatcher(max_workers=4, deadline=10)
+
+    start = time.monotonic()
+    results = dispatcher.dispatch({"Fast": fast, "Slow": slow}, "Who is first?", first=1)
+
+    assert time.monotonic() - start < 1.5
+    assert results["Fast"]["status"] == "answer"
+    assert results["Slow"]["status"] == "cancelled"
+    assert len(fast["instance"]["history"]) == 3
+    time.sleep(2.5)
+    assert list(slow["instance"]["history"]) == slow_history
+    dispatcher.shutdown()
+
+def test_failing_provider_opens_the_breaker(fake_provider, make_bot, monkeypatch):
+    monkeypatch.setattr(RateScheduler, "MAX_RETRIES", 0)
+    bot_data = make_bot(fake_provider(error_rate=1.0))
+    dispatcher = Dispatcher(max_workers=2, deadline=10)
+    breaker = CircuitBreaker.for_provider("chatgpt_bot")
+
+    for _ in range(breaker.failure_threshold):
+        # ask() reports provider failures as "Error: ..." answers, which the breaker counts as failures
+        assert dispatcher.dispatch({"A": bot_data}, "Hello?")["A"]["text"].startswith("Error")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    result = dispatcher.dispatch({"A": bot_data}, "Hello?")["A"]
+    assert result["status"] == "skipped"
+    assert len(bot_data["instance"]["history"]) == 1
+    dispatcher.shutdown()
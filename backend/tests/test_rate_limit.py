@@ -0,0 +1,71 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket, RateScheduler, CallCancelled
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A hand-driven monotonic clock for the rate limit module"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time, sleep=time.sleep))
+    return now
+
+def test_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+    clock[0] += 30
+    assert bucket.reserve(29) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+def test_bucket_never_holds_more_than_a_minute(clock):
+    bucket = TokenBucket(60)
+    clock[0] += 3600
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) > 0.0
+
+def test_refund_returns_tokens(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    bucket.refund(10)
+    assert bucket.reserve(10) == 0.0
+
+def test_rate_limit_is_retried_after_retry_after(fake_provider, make_bot):
+    provider = fake_provider(rate_limit_rate=1.0, retry_after=0.3)
+    bot = make_bot(provider)["instance"]
+    scheduler = bot["scheduler"]
+
+    def first_call_limited(**kwargs):
+        try:
+            return bot["client"].chat.completions.create(**kwargs)
+        finally:
+            # Only the first request is rate limited
+            provider.server.config.rate_limit_rate = 0.0
+
+    start = time.monotonic()
+    response, retries = scheduler.call(first_call_limited, 10, model=bot["model"], messages=[{"role": "user", "content": "hi"}])
+
+    assert retries == 1
+    assert time.monotonic() - start >= 0.3
+    assert response.choices[0].message.content.startswith("Fake ")
+    stats = RateScheduler.stats()[scheduler.label]
+    assert stats["rate_limited"] == 1
+    assert stats["retries"] == 1
+
+def test_cancel_stops_a_queued_call():
+    scheduler = RateScheduler("test", requests_per_minute=1)
+    scheduler.call(lambda: None)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    start = time.monotonic()
+    with pytest.raises(CallCancelled):
+        scheduler.call(lambda: None, cancel=cancel)
+    assert time.monotonic() - start < 5
+    # The cancelled call gave its reservation back
+    assert scheduler.requests.level == pytest.approx(0.0, abs=0.1)
@@ -0,0 +1,61 @@
+import chatgpt_bot
+from history import HistoryStore
+from response_cache import ResponseCache
+from transport import Transport
+from upload import Upload
+from dispatcher import Dispatcher
+
+def _bot(model="gpt-4.1-nano", history=None):
+    return {"model": model, "history": HistoryStore(history or [{"role": "system", "content": "You are a helpful assistant."}])}
+
+def test_key_covers_everything_that_shapes_the_request(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n")
+    upload = Upload.from_path(str(path))
+    key = ResponseCache.make_key("chatgpt_bot", _bot(), "question", upload)
+
+    assert key == ResponseCache.make_key("chatgpt_bot", _bot(), "question", upload)
+    assert key != ResponseCache.make_key("chatgpt_bot", _bot(), "another question", upload)
+    assert key != ResponseCache.make_key("chatgpt_bot", _bot(model="gpt-4o"), "question", upload)
+    assert key != ResponseCache.make_key("deepseek_bot", _bot(), "question", upload)
+    assert key != ResponseCache.make_key("chatgpt_bot", _bot(), "question", upload, file_prompt="summarize")
+    assert key != ResponseCache.make_key("chatgpt_bot", _bot(), "question", upload.with_full_data())
+    assert key != ResponseCache.make_key("chatgpt_bot", _bot(), "question")
+
+    longer = _bot(history=[{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "hi"}])
+    assert key != ResponseCache.make_key("chatgpt_bot", longer, "question", upload)
+
+def test_get_and_put(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), enabled=True)
+    assert cache.get("key") is None
+
+    cache.put("key", "answer", [{"role": "user", "content": "q"}, {"role": "assistant", "content": "answer"}])
+    assert cache.get("key") == ("answer", [{"role": "user", "content": "q"}, {"role": "assistant", "content": "answer"}])
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), ttl=-1, enabled=True)
+    cache.put("key", "answer", [])
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_same_turn_is_answered_from_the_cache(tmp_path, fake_provider, make_bot):
+    provider = fake_provider()
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), enabled=True)
+    first = make_bot(provider, "First", response_cache=cache)
+    second = make_bot(provider, "Second", response_cache=cache)
+    dispatcher = Dispatcher(max_workers=2, deadline=10)
+
+    base_url = Transport.resolve(chatgpt_bot.BASE_URL)
+
+    answer = dispatcher.dispatch({"First": first}, "Cache me")["First"]
+    sent = Transport._requests[base_url]
+    replayed = dispatcher.dispatch({"Second": second}, "Cache me")["Second"]
+
+    assert replayed["status"] == "answer"
+    assert replayed["text"] == answer["text"]
+    assert Transport._requests[base_url] == sent
+    assert list(second["instance"]["history"]) == list(first["instance"]["history"])
+    assert cache.stats()["hits"] == 1
+    dispatcher.shutdown()
@@ -0,0 +1,95 @@
+import os
+import threading
+import importlib.util
+from urllib.parse import urlsplit, urlunsplit
+
+class Transport:
+    """One keep-alive HTTP connection pool per provider base URL, shared by every adapter"""
+
+    _clients = {}
+    _requests = {}
+    _lock = threading.Lock()
+
+    HTTP2 = importlib.util.find_spec("h2") is not None
+
+    @staticmethod
+    def resolve(base_url):
+        """Swap a provider's origin for PROVIDER_BASE_URL, e.g. the local fake provider, keeping its path"""
+        override = os.getenv("PROVIDER_BASE_URL")
+        if not override:
+            return base_url
+        origin = urlsplit(override)
+        parts = urlsplit(base_url)
+        return urlunsplit((origin.scheme, origin.netloc, origin.path.rstrip("/") + parts.path, parts.query, parts.fragment))
+
+    @classmethod
+    def get_client(cls, base_url):
+        """Return the shared httpx client for a base URL, creating it on first use"""
+        with cls._lock:
+            client = cls._clients.get(base_url)
+            if client is None:
+                import httpx
+
+                cls._requests[base_url] = 0
+
+                def count_request(request):
+                    cls._requests[base_url] += 1
+
+                limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+                transport = None
+                cassette_mode = os.getenv("PROVIDER_CASSETTE_MODE")
+                if cassette_mode:
+                    from cassette import CassetteTransport
+                    transport = CassetteTransport(
+                        cassette_mode,
+                        os.getenv("PROVIDER_CASSETTE_DIR", "cassettes"),
+                        inner=httpx.HTTPTransport(http2=cls.HTTP2, limits=limits)
+                    )
+
+                client = httpx.Client(
+                    http2=cls.HTTP2,
+                    limits=limits,
+                    transport=transport,
+                    timeout=httpx.Timeout(120, connect=10),
+                    event_hooks={"request": [count_request]}
+                )
+                cls._clients[base_url] = client
+            return client
+
+    @classmethod
+    def preconnect(cls, base_url):
+        """Open a connection to a provider so the first real request skips the TLS handshake"""
+        import httpx
+
+        if os.getenv("PROVIDER_CASSETTE_MODE"):
+            return
+        base_url = cls.resolve(base_url)
+        try:
+            cls.get_client(base_url).head(base_url, timeout=10)
+        except httpx.HTTPError:
+            pass
+
+    @classmethod
+    def pool_stats(cls):
+        """Requests sent and connections held by each pool"""
+        stats = {}
+        with cls._lock:
+            for base_url, client in cls._clients.items():
+                # httpx keeps its connection pool private, so read it defensively
+                transport = getattr(client, "_transport", None)
+                pool = getattr(getattr(transport, "inner", transport), "_pool", None)
+                connections = getattr(pool, "connections", [])
+                stats[base_url] = {
+                    "requests": cls._requests[base_url],
+                    "connections": len(connections),
+                    "idle": sum(1 for connection in connections if connection.is_idle()),
+                    "http2": cls.HTTP2
+                }
+        return stats
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for client in cls._clients.values():
+                client.close()
+            cls._clients.clear()
\ No newline at end of file
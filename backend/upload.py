@@ -0,0 +1,161 @@
+import os
+import csv
+import copy
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from file_handler import FileHandler
+from digest import DataDigest, XLSX_MIME_TYPE
+from extraction import DocumentExtractor
+from images import ImageProcessor
+
+# Text files above this size are streamed from disk rather than held in memory
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+HASH_BLOCK_BYTES = 1024 * 1024
+TEXT_MIME_TYPES = ('application/json', 'application/x-yaml', 'application/xml', 'application/csv')
+
+class Upload:
+    """A file read once and shared by every bot, with its encodings computed on demand"""
+
+    MAX_CACHED = 8
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, path, data, sha256, size=None, head=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.data = data
+        self.size = len(data) if size is None else size
+        self.sha256 = sha256
+        self.mime_type = FileHandler.guess_mime_type(path, data if head is None else head)
+        self.full_data = False
+
+    @classmethod
+    def from_path(cls, path):
+        """Read a file and return its Upload, reusing an earlier one with the same bytes
+
+        Large text files are only hashed, a block at a time, and left on disk
+        for the chunker; everything else is read into memory once.
+        """
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            head = file.read(SNIFF_BYTES)
+            large = size > LARGE_FILE_BYTES and cls._text_like(FileHandler.guess_mime_type(path, head))
+            if large:
+                sha = hashlib.sha256(head)
+                for block in iter(lambda: file.read(HASH_BLOCK_BYTES), b""):
+                    sha.update(block)
+                data = None
+            else:
+                data = head + file.read()
+                sha = hashlib.sha256(data)
+
+        digest = sha.hexdigest()
+
+        with cls._lock:
+            upload = cls._cache.get(digest)
+            if upload is None:
+                upload = cls(path, data, digest, size=size, head=head if large else None)
+                cls._cache[digest] = upload
+                if len(cls._cache) > cls.MAX_CACHED:
+                    cls._cache.popitem(last=False)
+            else:
+                cls._cache.move_to_end(digest)
+
+        return upload
+
+    @staticmethod
+    def _text_like(mime_type):
+        return mime_type.startswith('text/') or mime_type in TEXT_MIME_TYPES or mime_type.endswith('+xml')
+
+    @property
+    def is_image(self):
+        return self.mime_type.startswith('image/')
+
+    @property
+    def is_text_like(self):
+        return self._text_like(self.mime_type)
+
+    @property
+    def is_structured(self):
+        return DataDigest.is_structured(self.mime_type)
+
+    @property
+    def is_document(self):
+        return DocumentExtractor.is_document(self.mime_type)
+
+    @property
+    def is_large(self):
+        """Whether the file was left on disk instead of being read into memory"""
+        return self.data is None
+
+    @property
+    def estimated_tokens(self):
+        return self.size // 4
+
+    @cached_property
+    def text(self):
+        """The file decoded as UTF-8, or None for binary and large files"""
+        if self.data is None:
+            return None
+        try:
+            return self.data.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+    @cached_property
+    def digest(self):
+        """A compact description of CSV, XLSX or JSON data, or None for other files and unparseable data"""
+        try:
+            return DataDigest.build(self)
+        except (ValueError, csv.Error):
+            # Malformed CSV or JSON is still sent as text; a workbook has no text to fall back to
+            if self.mime_type == XLSX_MIME_TYPE:
+                raise
+            return None
+
+    @property
+    def prompt_text(self):
+        """What the bots are sent for this file: the digest of structured data unless the full data was asked for"""
+        if not self.full_data and self.digest is not None:
+            return self.digest
+        return self.full_text
+
+    @cached_property
+    def full_text(self):
+        """The whole file as text, with workbooks rendered sheet by sheet as CSV and documents extracted"""
+        if self.mime_type == XLSX_MIME_TYPE:
+            return DataDigest.sheets_as_csv(self)
+        if self.is_document:
+            return DocumentExtractor.text(self)
+        return self.text
+
+    def with_full_data(self):
+        """A copy of this upload that sends its data in full instead of the digest"""
+        upload = copy.copy(self)
+        upload.full_data = True
+        return upload
+
+    def renamed(self, name):
+        """A copy of this upload under another name, leaving the shared cached one as it was"""
+        upload = copy.copy(self)
+        upload.name = name
+        # The digest quotes the file name
+        upload.__dict__.pop("digest", None)
+        return upload
+
+    @cached_property
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @cached_property
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def image(self, profile):
+        """This image resized and re-encoded for a provider's image profile"""
+        return ImageProcessor.prepare(self, profile)
\ No newline at end of file
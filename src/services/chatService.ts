@@ -1,41 +1,111 @@
 
-import { ChatRequest, ChatResponse, ChatPanel } from '@/types/chat';
+import { ChatRequest, ChatResponse } from '@/types/chat';
+
+export interface StreamHandlers {
+  onDelta?: (panelId: number, text: string) => void;
+  onResult?: (panelId: number, status: string, text: string) => void;
+  onSummary?: (summary: string) => void;
+}
 
 class ChatService {
   private baseUrl = process.env.VITE_API_URL || 'http://localhost:8000';
+  // The backend keeps each panel's conversation per session
+  private sessionId = crypto.randomUUID();
 
   async sendMessage(request: ChatRequest): Promise<ChatResponse> {
-    // This will be replaced with actual API call to your Python backend
-    // For now, return mock data to maintain current functionality
-    return this.mockChatResponse(request);
+    const response = await fetch(`${this.baseUrl}/api/chat`, {
+      method: 'POST',
+      headers: this.headers(),
+      body: JSON.stringify(await this.chatBody(request))
+    });
+    return this.json<ChatResponse>(response);
+  }
+
+  async streamMessage(request: ChatRequest, handlers: StreamHandlers): Promise<ChatResponse> {
+    const response = await fetch(`${this.baseUrl}/api/chat/stream`, {
+      method: 'POST',
+      headers: this.headers(),
+      body: JSON.stringify(await this.chatBody(request))
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Chat request failed: ${response.status}`);
+    }
+
+    const result: ChatResponse = { panelResponses: {} };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split('\n\n');
+      buffer = events.pop() || '';
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'delta') {
+          handlers.onDelta?.(data.panelId, data.text);
+        } else if (event === 'result') {
+          result.panelResponses[data.panelId] = data.text;
+          handlers.onResult?.(data.panelId, data.status, data.text);
+        } else if (event === 'summary') {
+          result.summary = data.summary;
+          handlers.onSummary?.(data.summary);
+        }
+      }
+    }
+
+    return result;
   }
 
   async uploadFile(file: File): Promise<string> {
-    // This will be replaced with actual file upload to your backend
-    console.log('File upload would be handled here:', file.name);
-    return Promise.resolve('mock-file-id');
+    const form = new FormData();
+    form.append('file', file);
+    const response = await fetch(`${this.baseUrl}/api/upload`, {
+      method: 'POST',
+      headers: { 'X-Session-Id': this.sessionId },
+      body: form
+    });
+    const { fileId } = await this.json<{ fileId: string }>(response);
+    return fileId;
   }
 
   async generateSummary(responses: { [key: string]: string }): Promise<string> {
-    // This will be replaced with actual summary generation from your backend
-    return Promise.resolve('Mock summary of responses from different models.');
+    const response = await fetch(`${this.baseUrl}/api/summary`, {
+      method: 'POST',
+      headers: this.headers(),
+      body: JSON.stringify({ responses })
+    });
+    const { summary } = await this.json<{ summary: string }>(response);
+    return summary;
   }
 
-  private async mockChatResponse(request: ChatRequest): Promise<ChatResponse> {
-    // Simulate API delay
-    await new Promise(resolve => setTimeout(resolve, 1500));
-
-    const panelResponses: { [panelId: number]: string } = {};
-    
-    request.panels.forEach(panel => {
-      panelResponses[panel.id] = `Mock response from ${panel.provider} using ${panel.model}.${panel.audience ? ` Audience: ${panel.audience}.` : ''}${panel.role ? ` Role: ${panel.role}.` : ''}`;
-    });
+  private headers(): HeadersInit {
+    return {
+      'Content-Type': 'application/json',
+      'X-Session-Id': this.sessionId
+    };
+  }
 
-    const summary = request.enableSummary && request.panels.length > 1 
-      ? 'Mock summary comparing responses from different models.'
-      : undefined;
+  private async chatBody(request: ChatRequest) {
+    const fileId = request.fileId || (request.fileUpload ? await this.uploadFile(request.fileUpload) : undefined);
+    return {
+      prompt: request.prompt,
+      panels: request.panels,
+      enableSummary: request.enableSummary,
+      fileId,
+      filePrompt: request.filePrompt
+    };
+  }
 
-    return { panelResponses, summary };
+  private async json<T>(response: Response): Promise<T> {
+    if (!response.ok) {
+      throw new Error(`Request to ${response.url} failed: ${response.status}`);
+    }
+    return response.json();
   }
 }
 
@@ -31,6 +31,8 @@ export interface ChatRequest {
   panels: ChatPanel[];
   enableSummary: boolean;
   fileUpload?: File;
+  fileId?: string;
+  filePrompt?: string;
 }
 
 export interface ChatResponse {
@@ -41,6 +41,6 @@ export const getDefaultModelProviders = (): ModelProvider[] => [
   { 
     id: "qwen", 
     name: "Qwen", 
-    models: ["qwen3-235b", "qwen3-16b", "qwen2.5-vl-72b"] 
+    models: ["qwen3-235b", "qwen3-30b", "qwen2.5-vl-72b"] 
   }
 ];